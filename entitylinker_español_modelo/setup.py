@@ -21,4 +21,9 @@ setup(
     ],
     python_requires=">=3.7",
     include_package_data=True,
+    entry_points={
+        "console_scripts": [
+            "tfg-entitylinker=tfg_entitylinker.cli:main",
+        ],
+    },
 )
@@ -0,0 +1,116 @@
+import json
+import time
+
+import pytest
+
+from tfg_entitylinker.candidate_retrieval import safe_get
+from tfg_entitylinker.cassette import CassetteTransport, PeticionNoGrabada
+
+URL = "https://www.wikidata.org/w/api.php"
+
+
+class TransporteFalso:
+    """
+    Wikidata mínima: 30 resultados para cualquier búsqueda, paginados con limit/continue.
+    """
+    QIDS = [f"Q{i}" for i in range(1, 31)]
+
+    def __init__(self):
+        self.peticiones = []
+
+    def get(self, url, params=None):
+        self.peticiones.append(dict(params))
+        if params["action"] == "wbgetentities":
+            return _Respuesta({"entities": {q: {"id": q, "labels": {}} for q in params["ids"].split("|")}})
+        inicio, limit = int(params.get("continue", 0)), int(params.get("limit", 7))
+        datos = {"search": [{"id": q, "label": q} for q in self.QIDS[inicio:inicio + limit]]}
+        if inicio + limit < len(self.QIDS):
+            datos["search-continue"] = inicio + limit
+        return _Respuesta(datos)
+
+
+class _Respuesta:
+    def __init__(self, datos):
+        self.status_code = 200
+        self.text = json.dumps(datos)
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    path = str(tmp_path / "bench.jsonl.gz")
+    grabadora = CassetteTransport(path, modo="record", transport=TransporteFalso())
+    grabadora.get(URL, params=busqueda(5))
+    grabadora.close()
+    return path
+
+
+def test_reproduce_lo_grabado(cassette_path):
+    cassette = CassetteTransport(cassette_path)
+    resp = safe_get(URL, params=busqueda(5), transport=cassette)
+    assert resp.json()["search"][0]["id"] == "Q1"
+    assert cassette.no_grabadas == 0
+
+
+def test_estricto_lanza_sin_reintentos(cassette_path):
+    cassette = CassetteTransport(cassette_path)
+    inicio = time.perf_counter()
+    with pytest.raises(PeticionNoGrabada) as excinfo:
+        safe_get(URL, params=busqueda(5, search="Valencia"), transport=cassette)
+    assert time.perf_counter() - inicio < 0.5  # sin backoff
+    assert "Valencia" in str(excinfo.value)
+    assert isinstance(excinfo.value, LookupError)
+    assert cassette.peticiones == 1 and cassette.no_grabadas == 1
+
+
+def test_no_estricto_responde_404(cassette_path):
+    cassette = CassetteTransport(cassette_path, estricto=False)
+    resp = cassette.get(URL, params=busqueda(5, search="Valencia"))
+    assert resp.status_code == 404
+    assert cassette.no_grabadas == 1
+
+
+def busqueda(limit, inicio=0, search="Madrid"):
+    return {"action": "wbsearchentities", "language": "es", "format": "json",
+            "limit": limit, "continue": inicio, "search": search, "maxlag": 5}
+
+
+def test_grabacion_amplia_la_busqueda(tmp_path):
+    real = TransporteFalso()
+    grabadora = CassetteTransport(str(tmp_path / "c.jsonl.gz"), modo="record", transport=real)
+    resp = grabadora.get(URL, params=busqueda(5))
+    grabadora.close()
+
+    # Se devuelve lo pedido, pero se graba la búsqueda con el límite máximo y sus entidades
+    assert [i["id"] for i in resp.json()["search"]] == TransporteFalso.QIDS[:5]
+    assert resp.json()["search-continue"] == 5
+    assert real.peticiones[0]["limit"] == 50
+    assert [p["action"] for p in real.peticiones] == ["wbsearchentities", "wbgetentities"]
+
+
+def test_reproduce_otro_top_n_y_reintentos(cassette_path):
+    cassette = CassetteTransport(cassette_path)
+    pagina = cassette.get(URL, params=busqueda(10, 5)).json()
+    assert [i["id"] for i in pagina["search"]] == TransporteFalso.QIDS[5:15]
+    assert pagina["search-continue"] == 15
+
+    ultima = cassette.get(URL, params=busqueda(20, 20)).json()
+    assert [i["id"] for i in ultima["search"]] == TransporteFalso.QIDS[20:]
+    assert "search-continue" not in ultima
+
+    # La mención se normaliza como en la caché de búsquedas del retriever
+    assert cassette.get(URL, params=busqueda(3, search="MADRID")).status_code == 200
+    assert cassette.no_grabadas == 0
+
+
+def test_reproduce_entidades_en_otros_lotes(cassette_path):
+    cassette = CassetteTransport(cassette_path)
+    params = {"action": "wbgetentities", "ids": "Q30|Q7|Q12", "format": "json",
+              "props": "labels|descriptions|aliases|claims|sitelinks", "maxlag": 5}
+    assert list(cassette.get(URL, params=params).json()["entities"]) == ["Q30", "Q7", "Q12"]
+
+    with pytest.raises(PeticionNoGrabada):
+        cassette.get(URL, params=dict(params, ids="Q7|Q31"))
@@ -0,0 +1,52 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+from tfg_entitylinker import context_utils, spacy_models
+from tfg_entitylinker.document_analysis import DocumentAnalysis
+
+MODELO = "blank:es+sentencizer"
+TEXTOS = [
+    "Madrid es la capital de España. Pedro Sánchez se reunió ayer en Madrid con el PP.\n\nLuego viajó a Elche!",
+    "  La Unión Europea (UE) aprobó el plan.El Salvador no.  ",
+    "Lorca",
+    "",
+]
+
+
+@pytest.fixture
+def nlp(monkeypatch):
+    # Pipeline ligero con oraciones, registrado para que context_utils lo use por nombre
+    nlp = spacy.blank("es")
+    nlp.add_pipe("sentencizer")
+    monkeypatch.setitem(spacy_models._modelos, (MODELO, ()), nlp)
+    return nlp
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+def test_contextos_iguales_que_context_utils(nlp, texto):
+    analisis = DocumentAnalysis(nlp(texto))
+    # Todos los offsets: inicio y fin de cada oración, espacios y el final del texto
+    for start in range(len(texto) + 1):
+        for ventana in (0, 2, 5):
+            assert analisis.contexto_ventana(start, ventana) == \
+                context_utils.get_local_context(texto, start, ventana), (start, ventana)
+        assert analisis.contexto_oracion(start) == \
+            context_utils.extraer_contexto_oracion(texto, start, model_name=MODELO), start
+
+
+def test_menciones_en_los_extremos_de_la_oracion(nlp):
+    texto = TEXTOS[0]
+    analisis = DocumentAnalysis(nlp(texto))
+    primera = "Madrid es la capital de España."
+    segunda = "Pedro Sánchez se reunió ayer en Madrid con el PP."
+    assert analisis.contexto_oracion(0) == primera
+    assert analisis.contexto_oracion(texto.index("Pedro")) == segunda
+    assert analisis.contexto_oracion(texto.index("PP")) == segunda
+    assert analisis.contexto_ventana(texto.index("Elche"), 2) == "viajó a Elche!"
+
+
+def test_sin_oraciones_todo_el_texto():
+    texto = "Madrid es la capital. Elche también."
+    analisis = DocumentAnalysis(spacy.blank("es")(texto))
+    assert analisis.contexto_oracion(texto.index("Elche")) == texto
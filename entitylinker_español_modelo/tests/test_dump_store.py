@@ -0,0 +1,110 @@
+import gzip
+import os
+
+import pytest
+
+from tfg_entitylinker.candidate_retrieval import CandidateRetriever
+from tfg_entitylinker.dump_store import WikidataDumpStore, ingerir_dump, leer_entidades_dump
+
+# Dump de muestra: unas pocas entidades españolas con el formato JSON de Wikidata
+MUESTRA = os.path.join(os.path.dirname(__file__), "data", "muestra_wikidata.json.gz")
+
+
+@pytest.fixture(scope="module")
+def store_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("dump") / "wikidata.sqlite")
+    ingerir_dump(MUESTRA, path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def store(store_path):
+    return WikidataDumpStore(store_path)
+
+
+def entidades_originales():
+    return {entity["id"]: entity for entity in leer_entidades_dump(MUESTRA)}
+
+
+def test_ingesta_solo_items(store_path):
+    total = ingerir_dump(MUESTRA, store_path + ".otro")
+    assert total == len(entidades_originales()) == 13
+
+
+def test_buscar_exacto_ordena_por_sitelinks(store):
+    items, completo = store.buscar("madrid", "es", 0, 10)
+    # El label de la ciudad y el alias de la comunidad coinciden exactamente; gana la de más sitelinks
+    assert [i["id"] for i in items] == ["Q2807", "Q5756"]
+    assert items[0]["label"] == "Madrid"
+    assert completo
+
+
+def test_buscar_ignora_tildes_y_mayusculas(store):
+    items, _ = store.buscar("ALMERIA", "es", 0, 5)
+    assert [i["id"] for i in items] == ["Q10400"]
+
+
+def test_buscar_prefijo_despues_de_exacto(store):
+    items, _ = store.buscar("las palmas", "es", 0, 5)
+    assert items[0]["id"] == "Q11992"
+
+    items, _ = store.buscar("comunidad de", "es", 0, 5)
+    assert [i["id"] for i in items] == ["Q5756"]
+
+
+def test_buscar_corto_solo_exacto(store):
+    items, _ = store.buscar("pp", "es", 0, 5)
+    assert [i["id"] for i in items] == ["Q204481"]
+    items, _ = store.buscar("p", "es", 0, 5)
+    assert items == []
+
+
+def test_buscar_paginas(store):
+    primera, completo = store.buscar("madrid", "es", 0, 1)
+    segunda, completo_2 = store.buscar("madrid", "es", 1, 1)
+    assert [i["id"] for i in primera + segunda] == ["Q2807", "Q5756"]
+    assert not completo and completo_2
+
+
+def test_obtener_entidades_misma_forma_que_la_api(store):
+    retriever = CandidateRetriever(backend=store)
+    originales = entidades_originales()
+    locales = store.obtener_entidades(list(originales) + ["Q1"])
+    assert set(locales) == set(originales)
+
+    for qid, entity in originales.items():
+        esperado = retriever._parsear_entidad(entity)
+        obtenido = retriever._parsear_entidad(locales[qid])
+        esperado["aliases"].sort()
+        obtenido["aliases"].sort()
+        assert obtenido == esperado, qid
+
+
+def test_dump_sin_comprimir(tmp_path):
+    path = str(tmp_path / "muestra.json")
+    with gzip.open(MUESTRA, "rt", encoding="utf-8") as f, open(path, "w", encoding="utf-8") as out:
+        out.write(f.read())
+    assert [e["id"] for e in leer_entidades_dump(path)] == list(entidades_originales())
+
+
+def test_buscar_prefijo_acotado(store):
+    items, _ = store.buscar("la", "es", 0, 10)
+    assert items == []
+    # Sin filas de prefijo, el match exacto sigue saliendo entero
+    items, _ = store.buscar("madrid", "es", 0, 10, max_nombres=0)
+    assert [i["id"] for i in items] == ["Q2807", "Q5756"]
+    items, _ = store.buscar("las", "es", 0, 10, max_nombres=1)
+    assert len(items) == 1
+
+
+def test_reingesta_no_duplica_nombres(tmp_path):
+    path = str(tmp_path / "wikidata.sqlite")
+    ingerir_dump(MUESTRA, path)
+    antes = WikidataDumpStore(path).buscar("madrid", "es", 0, 10)
+    ingerir_dump(MUESTRA, path)
+
+    store = WikidataDumpStore(path)
+    conn = store._conexion()
+    assert conn.execute("SELECT COUNT(*) FROM nombres").fetchone() == \
+        conn.execute("SELECT COUNT(*) FROM (SELECT DISTINCT nombre, qid FROM nombres)").fetchone()
+    assert store.buscar("madrid", "es", 0, 10) == antes
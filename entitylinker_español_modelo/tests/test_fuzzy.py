@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from tfg_entitylinker.dump_store import ingerir_dump
+from tfg_entitylinker.fuzzy import FuzzyIndex, construir_fuzzy, limpiar_mencion
+from tfg_entitylinker.lexicon import Lexicon, construir_lexicon
+
+MUESTRA = os.path.join(os.path.dirname(__file__), "data", "muestra_wikidata.json.gz")
+
+
+@pytest.fixture(scope="module")
+def fuzzy(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("fuzzy")
+    store_path = str(directorio / "wikidata.sqlite")
+    lexicon_path = str(directorio / "wikidata.lex")
+    fuzzy_path = str(directorio / "wikidata.fuzzy")
+    ingerir_dump(MUESTRA, store_path)
+    construir_lexicon(store_path, lexicon_path)
+    construir_fuzzy(lexicon_path, fuzzy_path)
+    lexicon = Lexicon(lexicon_path)
+    fuzzy = FuzzyIndex(fuzzy_path, lexicon)
+    yield fuzzy
+    fuzzy.close()
+    lexicon.close()
+
+
+@pytest.mark.parametrize("mencion, esperada", [
+    ("Alicante", "alicante"),
+    ("Elche", "elche"),
+    ("Lorca", "lorca"),
+    ("Almería", "almeria"),
+    ("Las Palmas", "palmas"),
+    ("la Generalitat Valenciana", "generalitat valenciana"),
+    ("de los Andes", "andes"),
+    ("del Ebro", "ebro"),
+    ("L'Alcúdia", "alcudia"),
+    ("La", "la"),
+])
+def test_limpiar_mencion(mencion, esperada):
+    assert limpiar_mencion(mencion) == esperada
+
+
+@pytest.mark.parametrize("mencion, qid", [
+    ("Alicamte", "Q11959"),
+    ("Elchee", "Q12600"),
+    ("Lorka", "Q184425"),
+    ("Almerya", "Q10400"),
+    ("Las Palmaz", "Q11992"),
+    ("El Salvadr", "Q792"),
+    ("La Riojaa", "Q5727"),
+    ("la Union Europea", "Q458"),
+])
+def test_erratas(fuzzy, mencion, qid):
+    items, _ = fuzzy.buscar(mencion, "es", 0, 5)
+    assert items and items[0]["id"] == qid
+
+
+def test_menor_distancia_entre_variantes(fuzzy):
+    # Sin artículo, "salvadr" queda lejos de "el salvador"; con artículo está a una edición
+    assert dict(fuzzy.buscar_claves("El Salvadr"))["el salvador"] == 1
+
+
+def test_minimo_sin_trigramas_descartados(fuzzy):
+    # " al", "alm", " el" y "che" están en 3 claves: con el tope en 2 se descartan,
+    # y el mínimo de trigramas comunes tiene que calcularse sin ellos
+    acotado = FuzzyIndex(fuzzy.path, fuzzy.lexicon, max_postings_grama=2)
+    try:
+        assert dict(acotado.buscar_claves("Almerya")) == {"almeria": 1}
+        assert dict(acotado.buscar_claves("Elchee")) == {"elche": 1}
+    finally:
+        acotado.close()
+
+
+def test_fuzzy_con_ruta_de_lexicon(fuzzy):
+    # Sin Lexicon compartido, el índice abre el suyo a partir de la ruta y lo cierra al cerrarse
+    propio = FuzzyIndex(fuzzy.path, fuzzy.lexicon.path)
+    items, _ = propio.buscar("Lorka", "es", 0, 5)
+    assert items[0]["id"] == "Q184425"
+    propio.close()
+    assert fuzzy.buscar("Lorka", "es", 0, 5)[0] == items
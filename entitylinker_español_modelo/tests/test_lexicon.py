@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from tfg_entitylinker.dump_store import WikidataDumpStore, ingerir_dump
+from tfg_entitylinker.lexicon import Lexicon, construir_lexicon
+
+MUESTRA = os.path.join(os.path.dirname(__file__), "data", "muestra_wikidata.json.gz")
+
+
+@pytest.fixture(scope="module")
+def rutas(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("lexicon")
+    store_path = str(directorio / "wikidata.sqlite")
+    lexicon_path = str(directorio / "wikidata.lex")
+    ingerir_dump(MUESTRA, store_path)
+    construir_lexicon(store_path, lexicon_path)
+    return store_path, lexicon_path
+
+
+@pytest.fixture(scope="module")
+def lexicon(rutas):
+    lexicon = Lexicon(rutas[1])
+    yield lexicon
+    lexicon.close()
+
+
+def test_buscar_exacto(lexicon):
+    assert [qid for qid, _ in lexicon.buscar_exacto("Madrid")] == ["Q2807", "Q5756"]
+    assert lexicon.buscar_exacto("Madrit") == []
+
+
+def test_buscar_prefijo(lexicon):
+    assert [qid for qid, _ in lexicon.buscar_prefijo("las pal")] == ["Q11992"]
+
+
+def test_menciones_cortas_sin_prefijo(lexicon):
+    # "el" es prefijo de "el salvador", "elche" y "elx", pero con menos de 3 caracteres solo vale el match exacto
+    assert lexicon.buscar_prefijo("El") == []
+    assert lexicon.buscar("El", "es", 0, 10) == ([], True)
+    items, completo = lexicon.buscar("UE", "es", 0, 10)
+    assert [i["id"] for i in items] == ["Q458"]
+    assert completo
+    assert [qid for qid, _ in lexicon.buscar_prefijo("elc")] == ["Q12600"]
+
+
+@pytest.mark.parametrize("mencion", ["pp", "ue", "madrid", "las palmas", "comunidad de", "el"])
+def test_mismo_orden_que_el_almacen(rutas, lexicon, mencion):
+    store = WikidataDumpStore(rutas[0])
+    items_store, _ = store.buscar(mencion, "es", 0, 10)
+    items_lexicon, _ = lexicon.buscar(mencion, "es", 0, 10)
+    assert [i["id"] for i in items_lexicon] == [i["id"] for i in items_store]
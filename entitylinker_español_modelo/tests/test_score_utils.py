@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from tfg_entitylinker.score_utils import (
+    calcular_score_total, calcular_scores_totales, indice_mejor, score_calidad, scores_calidad
+)
+
+PESOS = [(0.45, 0.20, 0.15, 0.20), (0.4, 0.3, 0.1, 0.2), (1.0, 0.0, 0.0, 0.0)]
+
+
+def candidatos_aleatorios(rng, n, dtype):
+    similitudes = rng.uniform(-1, 1, n).astype(dtype)
+    tipos = rng.choice([1.0, 0.5, -0.5], n).tolist()
+    matches = rng.choice([0.0, 1.0], n).tolist()
+    sitelinks = rng.integers(0, 300, n).tolist()
+    return similitudes, tipos, matches, sitelinks
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("pesos", PESOS)
+def test_scores_totales_igual_que_escalar(dtype, pesos):
+    rng = np.random.default_rng(0)
+    for n in (1, 2, 7, 50):
+        similitudes, tipos, matches, sitelinks = candidatos_aleatorios(rng, n, dtype)
+        max_sitelinks = max(sitelinks)
+        calidades = scores_calidad(sitelinks, max_sitelinks)
+
+        escalares = [
+            calcular_score_total(s, t, m, score_calidad({"sitelinks": sl}, max_sitelinks), pesos=pesos)
+            for s, t, m, sl in zip(similitudes, tipos, matches, sitelinks)
+        ]
+        totales = calcular_scores_totales(similitudes, tipos, matches, calidades, pesos=pesos)
+
+        assert totales.dtype == np.dtype(dtype)
+        # Idénticos bit a bit, no solo aproximados: de ellos depende el desempate
+        np.testing.assert_array_equal(totales, np.array(escalares, dtype=dtype))
+        assert indice_mejor(totales) == escalares.index(max(escalares))
+
+
+def test_scores_calidad_sin_sitelinks():
+    np.testing.assert_array_equal(scores_calidad([0, 0], 0), [0.0, 0.0])
+    assert score_calidad({"sitelinks": 0}, 0) == 0.0
+
+
+def test_indice_mejor_primero_en_empate():
+    assert indice_mejor(np.array([0.2, 0.7, 0.7, 0.1])) == 1
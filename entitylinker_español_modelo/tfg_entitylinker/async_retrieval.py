@@ -0,0 +1,81 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .candidate_retrieval import MAX_IDS_POR_PETICION
+
+
+class AsyncCandidateRetriever:
+    """
+    Versión asyncio de CandidateRetriever para resolver todas las menciones de un documento a la vez.
+
+    - Envuelve un CandidateRetriever síncrono y ejecuta sus peticiones en un pool
+      de hilos de tamaño `max_concurrencia`, que actúa como límite global de
+      peticiones simultáneas para todas las corrutinas que lo comparten.
+    - Comparte con el retriever síncrono las cachés y el transporte HTTP, así que
+      lo que se precarga aquí lo aprovecha después el bucle de scoring síncrono.
+    """
+    def __init__(self, retriever, max_concurrencia=8):
+        self.retriever = retriever
+        self.max_concurrencia = max_concurrencia
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrencia, thread_name_prefix="el-retrieval")
+
+    async def _ejecutar(self, funcion, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(funcion, *args, **kwargs))
+
+    async def buscar_candidatos(self, mencion, limit=None):
+        resultados, _ = await self.buscar_candidatos_pagina(mencion, limit=limit)
+        return resultados
+
+    async def buscar_candidatos_pagina(self, mencion, offset=0, limit=None):
+        return await self._ejecutar(self.retriever.buscar_candidatos_pagina, mencion, offset=offset, limit=limit)
+
+    async def obtener_detalles_entidades(self, qids, labels_wb=None):
+        """
+        Hidrata los QIDs en lotes de MAX_IDS_POR_PETICION lanzados en paralelo.
+        """
+        qids = list(dict.fromkeys(qids))
+        lotes = [qids[i:i + MAX_IDS_POR_PETICION] for i in range(0, len(qids), MAX_IDS_POR_PETICION)]
+        parciales = await asyncio.gather(*(
+            self._ejecutar(self.retriever.obtener_detalles_entidades, lote, labels_wb)
+            for lote in lotes
+        ))
+        detalles = {}
+        for parcial in parciales:
+            detalles.update(parcial)
+        return detalles
+
+    async def precargar(self, menciones, limit=None):
+        """
+        Busca y recupera los detalles de la primera página de candidatos de todas
+        las menciones de forma concurrente, dejando ambos resultados en caché.
+
+        Args:
+            menciones (list): Textos de las menciones (se ignoran repetidos).
+            limit (int): Tamaño de la primera página (por defecto, `top_n` del retriever).
+
+        Returns:
+            dict: {mencion: [{"id", "label"}, ...]} con los resultados de búsqueda.
+        """
+        limit = limit or self.retriever.top_n
+        unicas = list(dict.fromkeys(menciones))
+
+        # 1) Todas las búsquedas en paralelo (sin hidratar todavía)
+        paginas = await asyncio.gather(*(
+            self._ejecutar(self.retriever.buscar_resultados, mencion, 0, limit)
+            for mencion in unicas
+        ))
+        busquedas = {mencion: items for mencion, (items, _) in zip(unicas, paginas)}
+
+        # 2) Una única hidratación por lotes con los QIDs de todas las menciones
+        labels_wb = {}
+        for items in busquedas.values():
+            for item in items:
+                labels_wb.setdefault(item["id"], item.get("label", ""))
+        await self.obtener_detalles_entidades(list(labels_wb), labels_wb)
+
+        return busquedas
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """
+    Caché en memoria del proceso (comportamiento por defecto).
+
+    Sin `ttl` ni `max_entradas` se comporta como un diccionario normal.
+    Con `max_entradas` expulsa la entrada usada hace más tiempo (LRU).
+    """
+    def __init__(self, ttl=None, max_entradas=None):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._datos = OrderedDict()  # clave -> (valor, expira)
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira = entrada
+                if expira is None or expira > time.time():
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return valor
+                del self._datos[clave]
+            self.misses += 1
+            return default
+
+    def set(self, clave, valor, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expira = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            if self.max_entradas is not None:
+                while len(self._datos) > self.max_entradas:
+                    self._datos.popitem(last=False)
+
+    def __contains__(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            return entrada is not None and (entrada[1] is None or entrada[1] > time.time())
+
+    def __getitem__(self, clave):
+        valor = self.get(clave)
+        if valor is None:
+            raise KeyError(clave)
+        return valor
+
+    def __setitem__(self, clave, valor):
+        self.set(clave, valor)
+
+    def __len__(self):
+        return len(self._datos)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entradas": len(self)}
+
+
+class SQLiteCache:
+    """
+    Caché persistente en un fichero SQLite, compartida entre procesos y reinicios.
+
+    - Los valores se guardan serializados en JSON.
+    - `ttl` (segundos) marca la caducidad por defecto de cada entrada.
+    - `max_entradas` limita el tamaño expulsando las entradas con acceso más antiguo (LRU).
+      El tamaño se comprueba cada `intervalo_poda` inserciones de cada proceso (por
+      defecto el 1% de `max_entradas`), así que puede superarse temporalmente en esa cantidad.
+    - El acceso de una entrada solo se actualiza en una lectura si tiene más de
+      `refresco_acceso` segundos (por defecto ttl/10, o 60 s sin ttl): las lecturas
+      no toman el bloqueo de escritura en cada acierto.
+    - Usa modo WAL y una conexión por hilo/proceso, por lo que varios workers
+      (p. ej. de uvicorn) pueden leer y escribir el mismo fichero a la vez.
+    """
+    def __init__(self, path, ttl=None, max_entradas=None, tabla="cache", timeout=30.0,
+                 intervalo_poda=None, refresco_acceso=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        if intervalo_poda is None and max_entradas is not None:
+            intervalo_poda = max(1, max_entradas // 100)
+        self.intervalo_poda = intervalo_poda
+        if refresco_acceso is None:
+            refresco_acceso = ttl / 10 if ttl else 60.0
+        self.refresco_acceso = refresco_acceso
+        self._inserciones_sin_poda = 0
+        self.tabla = tabla
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        directorio = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directorio, exist_ok=True)
+
+        conn = self._conexion()
+        with conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.tabla} ("
+                "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL, acceso REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.tabla}_acceso ON {self.tabla} (acceso)")
+
+    def _conexion(self):
+        """
+        Devuelve la conexión del hilo actual, reabriéndola si el proceso se ha bifurcado.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, clave, default=None):
+        conn = self._conexion()
+        ahora = time.time()
+        fila = conn.execute(
+            f"SELECT valor, expira, acceso FROM {self.tabla} WHERE clave = ?", (clave,)
+        ).fetchone()
+
+        if fila is not None:
+            valor, expira, acceso = fila
+            if expira is None or expira > ahora:
+                if ahora - acceso > self.refresco_acceso:
+                    conn.execute(f"UPDATE {self.tabla} SET acceso = ? WHERE clave = ?", (ahora, clave))
+                self.hits += 1
+                return json.loads(valor)
+            conn.execute(f"DELETE FROM {self.tabla} WHERE clave = ? AND expira <= ?", (clave, ahora))
+
+        self.misses += 1
+        return default
+
+    def set(self, clave, valor, ttl=None):
+        conn = self._conexion()
+        ahora = time.time()
+        ttl = ttl if ttl is not None else self.ttl
+        expira = ahora + ttl if ttl is not None else None
+
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.tabla} (clave, valor, expira, acceso) VALUES (?, ?, ?, ?)",
+                (clave, json.dumps(valor, ensure_ascii=False), expira, ahora)
+            )
+
+        if self.max_entradas is not None:
+            self._inserciones_sin_poda += 1
+            if self._inserciones_sin_poda >= self.intervalo_poda:
+                self.podar()
+
+    def podar(self):
+        """
+        Expulsa las entradas con acceso más antiguo hasta dejar como mucho `max_entradas`.
+        Devuelve cuántas se han borrado.
+        """
+        self._inserciones_sin_poda = 0
+        if self.max_entradas is None:
+            return 0
+        conn = self._conexion()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            sobrantes = conn.execute(f"SELECT COUNT(*) FROM {self.tabla}").fetchone()[0] - self.max_entradas
+            if sobrantes <= 0:
+                return 0
+            cursor = conn.execute(
+                f"DELETE FROM {self.tabla} WHERE clave IN ("
+                f"SELECT clave FROM {self.tabla} ORDER BY acceso ASC LIMIT ?)",
+                (sobrantes,)
+            )
+            return cursor.rowcount
+
+    def __contains__(self, clave):
+        fila = self._conexion().execute(
+            f"SELECT 1 FROM {self.tabla} WHERE clave = ? AND (expira IS NULL OR expira > ?)",
+            (clave, time.time())
+        ).fetchone()
+        return fila is not None
+
+    def __getitem__(self, clave):
+        valor = self.get(clave)
+        if valor is None:
+            raise KeyError(clave)
+        return valor
+
+    def __setitem__(self, clave, valor):
+        self.set(clave, valor)
+
+    def __len__(self):
+        return self._conexion().execute(f"SELECT COUNT(*) FROM {self.tabla}").fetchone()[0]
+
+    def clear(self):
+        self._conexion().execute(f"DELETE FROM {self.tabla}")
+
+    def purgar_caducadas(self):
+        """
+        Elimina todas las entradas caducadas y devuelve cuántas se han borrado.
+        """
+        cursor = self._conexion().execute(
+            f"DELETE FROM {self.tabla} WHERE expira IS NOT NULL AND expira <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entradas": len(self)}
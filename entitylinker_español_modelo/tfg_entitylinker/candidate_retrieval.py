@@ -1,61 +1,132 @@
 import requests
 import time
 
-def safe_get(url, params=None, max_retries=5, backoff_seconds=30):
+from .cache import MemoryCache
+from .cassette import PeticionNoGrabada
+from .text_utils import normalizar_mencion
+from .transport import HTTPTransport
+from .rate_limit import RateLimiter, calcular_backoff, parsear_retry_after
+
+def _es_error_maxlag(resp):
+    """
+    La API de MediaWiki responde a `maxlag` con un error que incluye `Retry-After`
+    y `X-Database-Lag` en las cabeceras.
+    """
+    return "X-Database-Lag" in resp.headers or "Retry-After" in resp.headers
+
+
+def safe_get(url, params=None, max_retries=5, backoff_seconds=1.0, max_backoff=60.0,
+             transport=None, rate_limiter=None):
     """
     Hace una petición GET segura.
-    Si recibe 429 o 503, espera y reintenta.
+    Si recibe 429, 503 o un error de `maxlag`, espera lo que indique `Retry-After`
+    (o un backoff exponencial con jitter si no lo indica) y reintenta.
+    Si se pasa un `transport` (ver HTTPTransport) se usa su pool de conexiones.
+    Si se pasa un `rate_limiter` (ver RateLimiter) se respeta su ritmo y las esperas
+    se aplican a todos los hilos que lo comparten.
     """
     for intento in range(max_retries):
+        if rate_limiter is not None:
+            rate_limiter.adquirir()
         try:
-            resp = requests.get(url, params=params, timeout=10)
-            if resp.status_code == 200:
+            if transport is not None:
+                resp = transport.get(url, params=params)
+            else:
+                resp = requests.get(url, params=params, timeout=10)
+        except PeticionNoGrabada:
+            raise  # no es un fallo de red: reintentar no sirve de nada
+        except Exception as e:
+            espera = calcular_backoff(intento, backoff_seconds, max_backoff)
+            print(f"[EXCEPTION] {e} en {url} - esperando {espera:.1f}s (intento {intento + 1})")
+        else:
+            maxlag = resp.status_code == 200 and bool(params) and "maxlag" in params and _es_error_maxlag(resp)
+            if resp.status_code in [429, 503] or maxlag:
+                espera = parsear_retry_after(resp.headers.get("Retry-After"))
+                if espera is None:
+                    espera = calcular_backoff(intento, backoff_seconds, max_backoff)
+                print(f"[RATE LIMIT] {resp.status_code} en {url} - esperando {espera:.1f}s (intento {intento + 1})")
+            elif resp.status_code == 200:
                 return resp
-            elif resp.status_code in [429, 503]:
-                print(f"[RATE LIMIT] {resp.status_code} en {url} - esperando {backoff_seconds}s (intento {intento + 1})")
-                time.sleep(backoff_seconds)
             else:
                 print(f"[ERROR] {resp.status_code} en {url}")
                 break
-        except Exception as e:
-            print(f"[EXCEPTION] {e} en {url}")
-            time.sleep(backoff_seconds)
+
+        if rate_limiter is not None:
+            rate_limiter.pausar(espera)
+        else:
+            time.sleep(espera)
 
     raise RuntimeError(f"[FATAL] Fallos repetidos accediendo a {url}")
 
+WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
+MAX_IDS_POR_PETICION = 50  # límite de ids de wbgetentities para clientes sin bot flag
+MAX_LIMIT_BUSQUEDA = 50  # límite máximo de resultados por petición de wbsearchentities
+
+def _detalles_vacios():
+    return {
+        "label_es": "",
+        "label_original": "",
+        "label": "",
+        "description": "",
+        "p31": [],
+        "aliases": [],
+        "sitelinks": 0
+    }
+
 class CandidateRetriever:
     """
     Recupera candidatos de entidades desde Wikidata a partir de una mención textual.
     
     - Usa la API de búsqueda `wbsearchentities` para obtener candidatos.
-    - Consulta `Special:EntityData` para enriquecer los datos de cada entidad (label, descripción, P31, aliases, sitelinks).
+    - Consulta `wbgetentities` por lotes de hasta 50 QIDs para enriquecer los datos de cada entidad (label, descripción, P31, aliases, sitelinks).
     """
-    def __init__(self, language="es", top_n=5):
+    def __init__(self, language="es", top_n=5, cache=None, cache_busquedas=None, ttl_busquedas_vacias=3600,
+                 transport=None, api_url=WIKIDATA_API_URL, rate_limiter=None, maxlag=5, backend=None,
+                 lexicon=None, fuzzy=None):
         self.language = language
         self.top_n = top_n
-        self.descripcion_cache = {}
+        # Backend alternativo a la API (p. ej. WikidataDumpStore); None = API de Wikidata
+        self.backend = backend
+        # Fuente local de candidatos alternativa a la búsqueda (p. ej. Lexicon)
+        self.lexicon = lexicon
+        # Índice aproximado (FuzzyIndex) usado cuando la búsqueda no encuentra nada
+        self.fuzzy = fuzzy
+        # Transporte HTTP propio del retriever (inyectable para tests y benchmarks)
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.api_url = api_url
+        # Limitador compartido por todos los hilos y corrutinas que usan este retriever
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.maxlag = maxlag
+        # Backend de caché de detalles de entidad (MemoryCache, SQLiteCache...)
+        self.descripcion_cache = cache if cache is not None else MemoryCache()
+        # Caché de resultados de wbsearchentities por mención normalizada
+        self.busqueda_cache = cache_busquedas if cache_busquedas is not None else MemoryCache(ttl=24 * 3600, max_entradas=10000)
+        self.ttl_busquedas_vacias = ttl_busquedas_vacias
 
     def buscar_candidatos(self, mencion, limit=None):
-        url = "https://www.wikidata.org/w/api.php"
-        params = {
-            "action": "wbsearchentities",
-            "language": self.language,
-            "format": "json",
-            "limit": limit or self.top_n,
-            "search": mencion
-        }
-        response = safe_get(url, params=params)
-        if response.status_code != 200:
-            return []
+        resultados, _ = self.buscar_candidatos_pagina(mencion, limit=limit)
+        return resultados
 
-        resultados = []
-        search_results = response.json().get("search", [])
+    def buscar_candidatos_pagina(self, mencion, offset=0, limit=None):
+        """
+        Recupera una página de candidatos de `wbsearchentities` a partir de `offset`,
+        de modo que los reintentos solo piden la cola de resultados que aún no tienen.
+
+        Returns:
+            tuple: (resultados, siguiente_offset). `siguiente_offset` es None si la
+            búsqueda no tiene más resultados.
+        """
+        limit = limit or self.top_n
+        search_results, siguiente_offset = self._buscar_en_cache(mencion, offset, limit)
+
+        # Una sola ronda de peticiones por lotes para todos los candidatos
+        labels_wb = {item.get("id", ""): item.get("label", "") for item in search_results}
+        detalles_por_qid = self.obtener_detalles_entidades(list(labels_wb), labels_wb)
 
+        resultados = []
         for item in search_results:
             qid = item.get("id", "")
-            label_wb = item.get("label", "")  # Este es el label mostrado en la búsqueda
-
-            detalles = self.obtener_detalles_entidad(qid, label_wb)
+            detalles = detalles_por_qid.get(qid, {})
 
             resultados.append({
                 "id": qid,
@@ -68,33 +139,170 @@ class CandidateRetriever:
                 "sitelinks": detalles.get("sitelinks", 0)
             })
 
-        return resultados
+        return resultados, siguiente_offset
+
+    def buscar_resultados(self, mencion, offset=0, limit=None):
+        """
+        Página de resultados de búsqueda ({"id", "label"}) sin hidratar las entidades,
+        servida y guardada en `busqueda_cache` (ver `_buscar_en_cache`). Sirve para
+        precargar las búsquedas de varias menciones antes de hidratarlas por lotes.
+
+        Returns:
+            tuple: (items, siguiente_offset), como `buscar_candidatos_pagina`.
+        """
+        return self._buscar_en_cache(mencion, offset, limit or self.top_n)
+
+    def _buscar_en_cache(self, mencion, offset, limit):
+        """
+        Sirve una página de resultados de búsqueda desde `busqueda_cache`.
+
+        La caché guarda, por idioma y mención normalizada (minúsculas, sin tildes,
+        espacios colapsados), el prefijo contiguo de resultados ya descargado, así
+        que una búsqueda previa con limit=15 responde a limit=5 o limit=10 sin
+        nuevas llamadas. Si el prefijo no alcanza, solo se descarga lo que falta.
+        Las búsquedas sin resultados se guardan como entradas negativas con
+        un TTL más corto (`ttl_busquedas_vacias`).
+        """
+        clave = f"{self.language}:{normalizar_mencion(mencion)}"
+        entrada = self.busqueda_cache.get(clave) or {"items": [], "completo": False}
+        items = entrada["items"]
+        completo = entrada["completo"]
+
+        if not completo and len(items) < offset + limit:
+            faltan = min(offset + limit - len(items), MAX_LIMIT_BUSQUEDA)
+            nuevos, completo = self._descargar_busqueda(mencion, len(items), faltan)
+            items = items + nuevos
+
+            ttl = self.ttl_busquedas_vacias if completo and not items else None
+            self.busqueda_cache.set(clave, {"items": items, "completo": completo}, ttl=ttl)
+
+        pagina = items[offset:offset + limit]
+        fin = offset + len(pagina)
+        siguiente_offset = fin if (fin < len(items) or not completo) and pagina else None
+        return pagina, siguiente_offset
+
+    def _descargar_busqueda(self, mencion, offset, limit):
+        """
+        Busca en la fuente principal y, si la primera página sale vacía, recurre al
+        índice aproximado (erratas, tildes, artículos) antes de que el bucle de
+        reintentos empiece a pedir más resultados.
+        """
+        items, completo = self._buscar_fuente(mencion, offset, limit)
+        if offset == 0 and not items and self.fuzzy is not None:
+            items, completo = self.fuzzy.buscar(mencion, self.language, offset, limit)
+        return items, completo
+
+    def _buscar_fuente(self, mencion, offset, limit):
+        """
+        Llama a `wbsearchentities` (o al léxico o backend local) y devuelve (items, completo),
+        donde `completo` indica que la búsqueda no tiene más resultados tras esta página.
+        """
+        if self.lexicon is not None:
+            return self.lexicon.buscar(mencion, self.language, offset, limit)
+        if self.backend is not None:
+            return self.backend.buscar(mencion, self.language, offset, limit)
+
+        params = {
+            "action": "wbsearchentities",
+            "language": self.language,
+            "format": "json",
+            "limit": limit,
+            "continue": offset,
+            "search": mencion
+        }
+        response = self._get_api(params)
+        if response.status_code != 200:
+            return [], True
+
+        data = response.json()
+        items = [
+            {"id": item.get("id", ""), "label": item.get("label", "")}
+            for item in data.get("search", [])
+        ]
+        return items, "search-continue" not in data
+
+    def _get_api(self, params):
+        if self.maxlag is not None:
+            params = dict(params, maxlag=self.maxlag)
+        return safe_get(self.api_url, params=params, transport=self.transport, rate_limiter=self.rate_limiter)
 
     def obtener_detalles_entidad(self, qid, label_wb=None):
         """
-        Consulta Special:EntityData para obtener información detallada de una entidad.
+        Devuelve la información detallada de una entidad (ver `obtener_detalles_entidades`).
+        """
+        labels_wb = {qid: label_wb} if label_wb else None
+        return self.obtener_detalles_entidades([qid], labels_wb)[qid]
+
+    def obtener_detalles_entidades(self, qids, labels_wb=None):
+        """
+        Obtiene la información detallada de varias entidades con `wbgetentities`,
+        pidiendo como mucho MAX_IDS_POR_PETICION QIDs por petición.
         Incluye: descripción, lista de P31, aliases multilingües y sitelinks.
+
+        Args:
+            qids (list): QIDs a consultar (se ignoran duplicados).
+            labels_wb (dict): Label mostrado en la búsqueda para cada QID (opcional).
+
+        Returns:
+            dict: {qid: detalles} con la misma forma que guarda `descripcion_cache`.
+        """
+        labels_wb = labels_wb or {}
+        detalles = {}
+        pendientes = []
+        for qid in qids:
+            if qid in detalles or qid in pendientes:
+                continue
+            cacheado = self.descripcion_cache.get(qid)
+            if cacheado is None:
+                pendientes.append(qid)
+            else:
+                detalles[qid] = cacheado
+
+        for i in range(0, len(pendientes), MAX_IDS_POR_PETICION):
+            lote = pendientes[i:i + MAX_IDS_POR_PETICION]
+            entidades = self._descargar_entidades(lote)
+            for qid in lote:
+                entity = entidades.get(qid)
+                if entity is None:
+                    detalles[qid] = _detalles_vacios()
+                else:
+                    detalles[qid] = self._parsear_entidad(entity, labels_wb.get(qid))
+                self.descripcion_cache.set(qid, detalles[qid])
+
+        return {qid: detalles[qid] for qid in qids}
+
+    def _descargar_entidades(self, qids):
+        """
+        Descarga un lote de entidades con `wbgetentities` (o del backend local).
+        Devuelve {qid: entity} solo para las entidades existentes.
         """
-        if qid in self.descripcion_cache:
-            return self.descripcion_cache[qid]
+        if self.backend is not None:
+            return self.backend.obtener_entidades(qids)
 
-        url = f"https://www.wikidata.org/wiki/Special:EntityData/{qid}.json"
-        response = safe_get(url)
+        params = {
+            "action": "wbgetentities",
+            "ids": "|".join(qids),
+            "props": "labels|descriptions|aliases|claims|sitelinks",
+            "format": "json"
+        }
+        response = self._get_api(params)
         if response.status_code != 200:
-            self.descripcion_cache[qid] = {
-                "label_es": "",
-                "label_original": "",
-                "label": "",
-                "description": "",
-                "p31": [],
-                "aliases": [],
-                "sitelinks": 0
-            }
-            return self.descripcion_cache[qid]
+            return {}
 
-        data = response.json()
-        entity = data.get("entities", {}).get(qid, {})
+        entidades = {}
+        for key, entity in response.json().get("entities", {}).items():
+            if "missing" in entity:
+                continue
+            # Las redirecciones se devuelven bajo el QID pedido, pero por si acaso
+            # también se indexan por el id real de la entidad
+            entidades[key] = entity
+            entidades.setdefault(entity.get("id", key), entity)
+        return entidades
 
+    def _parsear_entidad(self, entity, label_wb=None):
+        """
+        Extrae de una entidad en formato JSON de Wikidata los campos que usa el linker.
+        """
         # --- Labels ---
         labels = entity.get("labels", {})
         label_es = labels.get("es", {}).get("value", "")
@@ -135,11 +343,11 @@ class CandidateRetriever:
             if "datavalue" in c["mainsnak"]
         ]
 
-        # Sitelinks
+        # Sitelinks (los backends locales guardan directamente el número)
         sitelinks = entity.get("sitelinks", {})
-        num_sitelinks = len(sitelinks)
+        num_sitelinks = sitelinks if isinstance(sitelinks, int) else len(sitelinks)
 
-        resultado = {
+        return {
             "label_es": label_es,
             "label_original": label_original,
             "label": label_final,
@@ -148,6 +356,3 @@ class CandidateRetriever:
             "aliases": alias_list,
             "sitelinks": num_sitelinks
         }
-
-        self.descripcion_cache[qid] = resultado
-        return resultado
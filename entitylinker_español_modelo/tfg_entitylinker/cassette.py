@@ -0,0 +1,257 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+
+from .text_utils import normalizar_mencion
+
+MODOS = ("record", "replay")
+# Al grabar, las búsquedas se piden con el límite máximo de wbsearchentities para
+# que la misma cassette sirva cualquier top_n_candidatos y número de reintentos
+LIMIT_GRABACION_BUSQUEDA = 50
+MAX_IDS_GRABACION = 50  # ids por petición de wbgetentities al precargar entidades
+
+
+class RespuestaGrabada:
+    """
+    Respuesta HTTP reproducida desde una cassette, con la parte de la interfaz
+    de `requests.Response` que usa la librería.
+    """
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class PeticionNoGrabada(LookupError):
+    """
+    Petición que no está en la cassette durante una reproducción estricta.
+    Indica que la cassette no cubre la carga de trabajo medida: hay que volver a grabar.
+    """
+    def __init__(self, url, params=None):
+        self.url = url
+        self.params = dict(params or {})
+        super().__init__(f"Petición no grabada en la cassette: {url} {self.params}")
+
+
+def clave_peticion(url, params=None):
+    """
+    Clave estable de una petición: URL más parámetros ordenados.
+    """
+    return json.dumps([url, sorted((str(k), str(v)) for k, v in (params or {}).items())], ensure_ascii=False)
+
+
+def _parametros(params):
+    return {str(k): str(v) for k, v in (params or {}).items()}
+
+
+class CassetteTransport:
+    """
+    Transporte que graba y reproduce las respuestas de Wikidata en un fichero JSONL comprimido con gzip.
+
+    - modo "record": sirve lo ya grabado y, para lo nuevo, llama al transporte real
+      y añade la respuesta (solo las 200) a la cassette.
+    - modo "replay": sirve únicamente lo grabado, sin red. Con `estricto` (por
+      defecto) una petición no grabada lanza `PeticionNoGrabada`, para que un
+      benchmark no mida en silencio menos trabajo del real; sin él se responde
+      con un 404 y se cuenta en `no_grabadas`. `latencia` simula el tiempo de red
+      de cada petición.
+
+    Además de por la petición exacta, las respuestas se indexan por petición
+    lógica, de modo que una misma grabación cubre todo un barrido de parámetros:
+    - `wbsearchentities`: por idioma y mención normalizada se guarda el prefijo
+      contiguo de resultados, y cualquier `limit`/`continue` dentro de él se
+      sirve como un trozo (al grabar se pide `LIMIT_GRABACION_BUSQUEDA`).
+    - `wbgetentities`: cada entidad se guarda por separado, así que se sirve
+      cualquier combinación de `ids` ya vista. Al grabar una búsqueda se
+      descargan también las entidades de todos sus resultados.
+
+    Se inyecta en CandidateRetriever como cualquier otro transporte, así que las
+    cachés, el rate limiter y el parseo se ejercitan igual que en producción.
+    """
+    def __init__(self, path, modo="replay", transport=None, latencia=0.0, estricto=True):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de cassette no válido: {modo} (opciones: {MODOS})")
+        if modo == "record" and transport is None:
+            raise ValueError("El modo 'record' necesita un transporte real")
+        if modo == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"No existe la cassette: {path}")
+
+        self.path = path
+        self.modo = modo
+        self.transport = transport
+        self.latencia = latencia
+        self.estricto = estricto
+        self.peticiones = 0
+        self.no_grabadas = 0
+        self._respuestas = {}
+        self._busquedas = {}  # (idioma, mención normalizada) -> {"items", "completo"}
+        self._entidades = {}  # qid -> entidad
+        self._props_entidades = "labels|descriptions|aliases|claims|sitelinks"
+        self._cargar()
+        self._lock = threading.Lock()
+        self._salida = None
+        self._pendientes = 0
+        if modo == "record":
+            atexit.register(self.close)
+
+    def _cargar(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for linea in f:
+                    self._indexar(json.loads(linea))
+        except (EOFError, json.JSONDecodeError):
+            # Última línea incompleta si la grabación se interrumpió
+            pass
+
+    def _indexar(self, registro):
+        """
+        Guarda un registro por su clave exacta y, si es una búsqueda o una descarga
+        de entidades correcta, también en los índices por petición lógica.
+        """
+        self._respuestas[registro["clave"]] = registro
+        if registro["status"] != 200:
+            return
+        _, pares = json.loads(registro["clave"])
+        params = dict(pares)
+        accion = params.get("action")
+        if accion not in ("wbsearchentities", "wbgetentities"):
+            return
+        try:
+            datos = json.loads(registro["body"])
+        except ValueError:
+            return
+
+        if accion == "wbgetentities":
+            self._props_entidades = params.get("props", self._props_entidades)
+            self._entidades.update(datos.get("entities", {}))
+            return
+
+        clave = (params.get("language", ""), normalizar_mencion(params.get("search", "")))
+        entrada = self._busquedas.get(clave, {"items": [], "completo": False})
+        inicio = int(params.get("continue", 0))
+        items = datos.get("search", [])
+        # Solo se amplía el prefijo contiguo ya guardado
+        if inicio <= len(entrada["items"]) and inicio + len(items) >= len(entrada["items"]):
+            self._busquedas[clave] = {
+                "items": entrada["items"][:inicio] + items,
+                "completo": "search-continue" not in datos
+            }
+
+    def _respuesta_logica(self, params):
+        """
+        Respuesta construida desde los índices lógicos, o None si lo grabado no la cubre.
+        """
+        accion = params.get("action")
+        if accion == "wbgetentities":
+            qids = params.get("ids", "").split("|")
+            if not all(qid in self._entidades for qid in qids):
+                return None
+            datos = {"entities": {qid: self._entidades[qid] for qid in qids}, "success": 1}
+            return RespuestaGrabada(200, json.dumps(datos, ensure_ascii=False))
+
+        if accion == "wbsearchentities":
+            entrada = self._busquedas.get((params.get("language", ""), normalizar_mencion(params.get("search", ""))))
+            inicio = int(params.get("continue", 0))
+            fin = inicio + int(params.get("limit", 7))
+            if entrada is None or (len(entrada["items"]) < fin and not entrada["completo"]):
+                return None
+            pagina = entrada["items"][inicio:fin]
+            datos = {"searchinfo": {"search": params.get("search", "")}, "search": pagina, "success": 1}
+            if inicio + len(pagina) < len(entrada["items"]) or not entrada["completo"]:
+                datos["search-continue"] = inicio + len(pagina)
+            return RespuestaGrabada(200, json.dumps(datos, ensure_ascii=False))
+        return None
+
+    def _servir(self, clave, params):
+        registro = self._respuestas.get(clave)
+        if registro is not None:
+            return RespuestaGrabada(registro["status"], registro["body"], registro.get("headers"))
+        return self._respuesta_logica(_parametros(params))
+
+    def get(self, url, params=None):
+        self.peticiones += 1
+        clave = clave_peticion(url, params)
+        resp = self._servir(clave, params)
+
+        if resp is not None:
+            if self.latencia:
+                time.sleep(self.latencia)
+            return resp
+
+        if self.modo == "replay":
+            self.no_grabadas += 1
+            if self.estricto:
+                raise PeticionNoGrabada(url, params)
+            print(f"[CASSETTE] Petición no grabada: {url} {params}")
+            return RespuestaGrabada(404, "{}")
+
+        params_grabacion = params
+        if (params or {}).get("action") == "wbsearchentities":
+            limit = max(int(params.get("limit", 7)), LIMIT_GRABACION_BUSQUEDA)
+            params_grabacion = dict(params, limit=limit)
+        resp = self.transport.get(url, params=params_grabacion)
+        # No se graban los avisos de maxlag (200 con Retry-After), para no reproducirlos como éxito
+        if resp.status_code != 200 or "Retry-After" in resp.headers:
+            return resp
+        self._grabar(clave_peticion(url, params_grabacion), resp)
+        if params_grabacion is not params:
+            self._precargar_entidades(url, resp, params)
+            # La búsqueda ampliada se devuelve recortada a lo que se pidió
+            return self._servir(clave, params) or resp
+        return resp
+
+    def _precargar_entidades(self, url, resp_busqueda, params_busqueda):
+        """
+        Graba las entidades de todos los resultados de una búsqueda, para poder
+        reproducir configuraciones que hidraten más candidatos que la grabada.
+        Estas peticiones no cuentan en `peticiones`.
+        """
+        try:
+            qids = [item["id"] for item in resp_busqueda.json().get("search", []) if item.get("id")]
+        except (ValueError, KeyError, TypeError):
+            return
+        pendientes = [qid for qid in dict.fromkeys(qids) if qid not in self._entidades]
+        extra = {k: v for k, v in params_busqueda.items() if k == "maxlag"}
+        for i in range(0, len(pendientes), MAX_IDS_GRABACION):
+            params = {"action": "wbgetentities", "ids": "|".join(pendientes[i:i + MAX_IDS_GRABACION]),
+                      "props": self._props_entidades, "format": "json", **extra}
+            resp = self.transport.get(url, params=params)
+            if resp.status_code == 200 and "Retry-After" not in resp.headers:
+                self._grabar(clave_peticion(url, params), resp)
+
+    def _grabar(self, clave, resp):
+        registro = {"clave": clave, "status": resp.status_code, "body": resp.text}
+        with self._lock:
+            self._indexar(registro)
+            if self._salida is None:
+                # Cada sesión de grabación añade un miembro gzip nuevo al fichero
+                self._salida = gzip.open(self.path, "at", encoding="utf-8")
+            self._salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            self._pendientes += 1
+            if self._pendientes >= 100:
+                # Vuelca lo comprimido hasta ahora por si el proceso se interrumpe
+                self._salida.flush()
+                self._pendientes = 0
+
+    def close(self):
+        with self._lock:
+            if self._salida is not None:
+                self._salida.close()
+                self._salida = None
+        if self.transport is not None and hasattr(self.transport, "close"):
+            self.transport.close()
+
+    def __len__(self):
+        return len(self._respuestas)
@@ -0,0 +1,248 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+from .config import ConfigEL
+from .streaming import leer_jsonl, serializar_enlace
+
+FORMATOS = ("jsonl", "tsv", "txt")
+POLITICAS_ERROR = ("registrar", "saltar", "abortar")
+
+# Linker de cada proceso worker, creado una sola vez en `_iniciar_worker`
+_linker = None
+
+
+def detectar_formato(path):
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension in ("tsv", "tab"):
+        return "tsv"
+    return "txt"
+
+
+def leer_documentos(path, formato, campo_id="id", campo_texto="text"):
+    """
+    Recorre el corpus y devuelve (id, texto) por documento, sin cargarlo entero.
+
+    - jsonl: un objeto por línea con `campo_id` y `campo_texto`.
+    - tsv: cabecera con `campo_id` y `campo_texto`.
+    - txt: un documento por línea; el id es el número de línea (desde 1).
+    """
+    if formato == "jsonl":
+        for i, documento in enumerate(leer_jsonl(path), 1):
+            yield documento.get(campo_id, i), documento.get(campo_texto, "")
+    elif formato == "tsv":
+        csv.field_size_limit(2 ** 31 - 1)  # noticias largas en una sola celda
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for i, fila in enumerate(csv.DictReader(f, delimiter="\t"), 1):
+                yield fila.get(campo_id, i), fila.get(campo_texto) or ""
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for i, linea in enumerate(f, 1):
+                linea = linea.rstrip("\n")
+                if linea.strip():
+                    yield i, linea
+
+
+def ids_procesados(salida):
+    """
+    Ids ya escritos en un fichero de salida previo. Si la última línea quedó
+    a medias (proceso interrumpido) se recorta para poder seguir añadiendo.
+    """
+    hechos = set()
+    if not os.path.exists(salida):
+        return hechos
+    with open(salida, "rb+") as f:
+        valida = 0
+        for linea in f:
+            try:
+                hechos.add(json.dumps(json.loads(linea)["id"]))
+            except (ValueError, KeyError):
+                break
+            valida += len(linea)
+        f.truncate(valida)
+    return hechos
+
+
+def _iniciar_worker(config_kwargs):
+    """
+    Carga los modelos (spaCy y Sentence-Transformers) una sola vez por proceso.
+    """
+    global _linker
+    from .linker import EntityLinker
+    _linker = EntityLinker(ConfigEL(**config_kwargs))
+
+
+def _enlazar_bloque(bloque):
+    """
+    Enlaza un bloque de documentos [(id, texto)] en el worker.
+    Si el lote falla, se repite documento a documento para aislar el que da error.
+
+    Returns:
+        list: [(id, enlaces o None, error o None)]
+    """
+    try:
+        enlaces = _linker.link_batch([texto for _, texto in bloque], batch_size=len(bloque))
+        return [(doc_id, [serializar_enlace(e) for e in ents], None) for (doc_id, _), ents in zip(bloque, enlaces)]
+    except Exception:
+        resultados = []
+        for doc_id, texto in bloque:
+            _linker.entidades_previas = []
+            try:
+                resultados.append((doc_id, [serializar_enlace(e) for e in _linker.link(texto)], None))
+            except Exception as e:
+                resultados.append((doc_id, None, f"{type(e).__name__}: {e}"))
+        return resultados
+
+
+def _bloques(documentos, tam):
+    bloque = []
+    for documento in documentos:
+        bloque.append(documento)
+        if len(bloque) >= tam:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def enlazar_corpus(entrada, salida, config_kwargs=None, procesos=1, lote=32, formato=None,
+                   campo_id="id", campo_texto="text", reanudar=False, errores="registrar", informe=10.0):
+    """
+    Enlaza un corpus completo con `procesos` workers y escribe un JSONL con una
+    línea {"id", "entidades"} (o {"id", "error"}) por documento, en el orden de entrada.
+
+    - Cada worker crea su EntityLinker una vez; si `config_kwargs` incluye
+      `cache_path`, todos comparten la misma caché SQLite persistente.
+    - En vuelo hay como mucho 2 bloques de `lote` documentos por worker.
+    - `reanudar` salta los ids que ya están en `salida` y añade al final.
+    - `errores`: "registrar" escribe el error en la salida, "saltar" no escribe
+      nada (se reintentará al reanudar) y "abortar" detiene la ejecución.
+
+    Returns:
+        dict: Estadísticas (documentos, menciones, errores, segundos).
+    """
+    if errores not in POLITICAS_ERROR:
+        raise ValueError(f"Política de errores no válida: {errores} (opciones: {POLITICAS_ERROR})")
+    formato = formato or detectar_formato(entrada)
+    config_kwargs = config_kwargs or {}
+
+    hechos = ids_procesados(salida) if reanudar else set()
+    documentos = (
+        (doc_id, texto) for doc_id, texto in leer_documentos(entrada, formato, campo_id, campo_texto)
+        if json.dumps(doc_id) not in hechos
+    )
+    if hechos:
+        print(f"⏩ Reanudando: {len(hechos)} documentos ya procesados")
+
+    stats = {"documentos": 0, "menciones": 0, "errores": 0, "segundos": 0.0}
+    inicio = ultimo_informe = time.time()
+
+    pool = None
+    if procesos > 1:
+        pool = multiprocessing.get_context("spawn").Pool(procesos, initializer=_iniciar_worker, initargs=(config_kwargs,))
+    else:
+        _iniciar_worker(config_kwargs)
+
+    try:
+        with open(salida, "a" if reanudar else "w", encoding="utf-8") as out:
+            en_vuelo = deque()
+            bloques = _bloques(documentos, lote)
+
+            def escribir(resultados):
+                for doc_id, enlaces, error in resultados:
+                    if error is not None:
+                        stats["errores"] += 1
+                        print(f"[ERROR] Documento {doc_id}: {error}")
+                        if errores == "abortar":
+                            raise RuntimeError(f"Error en el documento {doc_id}: {error}")
+                        if errores == "saltar":
+                            continue
+                        out.write(json.dumps({"id": doc_id, "error": error}, ensure_ascii=False) + "\n")
+                    else:
+                        stats["menciones"] += len(enlaces)
+                        out.write(json.dumps({"id": doc_id, "entidades": enlaces}, ensure_ascii=False) + "\n")
+                    stats["documentos"] += 1
+                out.flush()
+
+            for bloque in bloques:
+                if pool is None:
+                    escribir(_enlazar_bloque(bloque))
+                else:
+                    en_vuelo.append(pool.apply_async(_enlazar_bloque, (bloque,)))
+                    # Backpressure: no se leen más documentos hasta que sale el bloque más antiguo
+                    while len(en_vuelo) >= 2 * procesos:
+                        escribir(en_vuelo.popleft().get())
+
+                if informe and time.time() - ultimo_informe >= informe:
+                    ultimo_informe = time.time()
+                    _imprimir_progreso(stats, ultimo_informe - inicio)
+
+            while en_vuelo:
+                escribir(en_vuelo.popleft().get())
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    stats["segundos"] = time.time() - inicio
+    _imprimir_progreso(stats, stats["segundos"])
+    return stats
+
+
+def _imprimir_progreso(stats, segundos):
+    segundos = max(segundos, 1e-9)
+    print(
+        f"📊 {stats['documentos']} documentos ({stats['documentos'] / segundos:.1f} doc/s), "
+        f"{stats['menciones']} menciones ({stats['menciones'] / segundos:.1f} menciones/s), "
+        f"{stats['errores']} errores"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="tfg-entitylinker",
+        description="Enlaza un corpus (JSONL, TSV o texto plano) con Wikidata usando varios procesos."
+    )
+    parser.add_argument("entrada", help="Corpus de entrada (.jsonl, .tsv o texto con un documento por línea)")
+    parser.add_argument("salida", help="Fichero JSONL de salida")
+    parser.add_argument("--formato", choices=FORMATOS, default=None, help="Formato de entrada (por defecto, según la extensión)")
+    parser.add_argument("--campo-id", default="id", help="Campo con el id del documento (JSONL/TSV)")
+    parser.add_argument("--campo-texto", default="text", help="Campo con el texto del documento (JSONL/TSV)")
+    parser.add_argument("--procesos", type=int, default=1, help="Número de procesos worker")
+    parser.add_argument("--lote", type=int, default=32, help="Documentos por bloque enviado a cada worker")
+    parser.add_argument("--config", default=None, help="Fichero JSON con parámetros de ConfigEL")
+    parser.add_argument("--cache", default=None, help="Caché SQLite de Wikidata compartida por los workers")
+    parser.add_argument("--reanudar", action="store_true", help="Saltar los documentos que ya están en la salida")
+    parser.add_argument("--errores", choices=POLITICAS_ERROR, default="registrar", help="Qué hacer con un documento que falla")
+    parser.add_argument("--informe", type=float, default=10.0, help="Segundos entre informes de rendimiento (0 = solo al final)")
+    args = parser.parse_args(argv)
+
+    config_kwargs = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config_kwargs = json.load(f)
+    if args.cache:
+        config_kwargs["cache_path"] = args.cache
+
+    try:
+        stats = enlazar_corpus(
+            args.entrada, args.salida, config_kwargs=config_kwargs, procesos=args.procesos, lote=args.lote,
+            formato=args.formato, campo_id=args.campo_id, campo_texto=args.campo_texto,
+            reanudar=args.reanudar, errores=args.errores, informe=args.informe
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {stats['documentos']} documentos enlazados en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
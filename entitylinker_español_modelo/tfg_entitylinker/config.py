@@ -17,7 +17,35 @@ class ConfigEL:
         filtrar_por_tipo=True,
         reusar_entidades_anteriores=True,
         bonus_coref_match=0.05,
-        bonus_coref_nomatch=0.2
+        bonus_coref_nomatch=0.2,
+
+        cache_path=None,
+        cache_ttl=None,
+        cache_max_entradas=None,
+        cache_busquedas_ttl=24 * 3600,
+        cache_busquedas_vacias_ttl=3600,
+
+        http_pool_size=10,
+        http_timeout=10,
+        user_agent=None,
+        max_concurrencia=8,
+        peticiones_por_segundo=5.0,
+        maxlag=5,
+        dump_store_path=None,
+        lexicon_path=None,
+        fuzzy_index_path=None,
+        fuzzy_lexicon_path=None,
+
+        cassette_path=None,
+        cassette_modo="replay",
+        cassette_latencia=0.0,
+        cassette_estricto=True,
+
+        embedding_cache_dir=None,
+        embedding_cache_capacidad=200000,
+
+        dense_index_path=None,
+        dense_top_k=10
     ):
         self.top_n_candidatos = top_n_candidatos
         self.score_threshold = score_threshold
@@ -37,3 +65,48 @@ class ConfigEL:
 
         self.bonus_coref_match = bonus_coref_match
         self.bonus_coref_nomatch = bonus_coref_nomatch
+
+        # Caché persistente de detalles de entidad (None = solo en memoria)
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.cache_max_entradas = cache_max_entradas
+
+        # Caché de búsquedas wbsearchentities (las vacías caducan antes)
+        self.cache_busquedas_ttl = cache_busquedas_ttl
+        self.cache_busquedas_vacias_ttl = cache_busquedas_vacias_ttl
+
+        # Transporte HTTP con pool de conexiones keep-alive
+        self.http_pool_size = http_pool_size
+        self.http_timeout = http_timeout
+        self.user_agent = user_agent
+
+        # Peticiones simultáneas máximas del retriever asíncrono
+        self.max_concurrencia = max_concurrencia
+
+        # Ritmo máximo de peticiones a Wikidata (token bucket) y parámetro maxlag de la API
+        self.peticiones_por_segundo = peticiones_por_segundo
+        self.maxlag = maxlag
+
+        # Almacén local construido a partir de un dump de Wikidata (None = API online)
+        self.dump_store_path = dump_store_path
+        # Léxico alias → QID mapeado en memoria para generar candidatos en local
+        self.lexicon_path = lexicon_path
+        # Índice aproximado para menciones con erratas; solo se consulta cuando la fuente principal no encuentra nada
+        self.fuzzy_index_path = fuzzy_index_path
+        # Léxico sobre el que se construyó el índice aproximado (None = lexicon_path); no cambia la fuente principal
+        self.fuzzy_lexicon_path = fuzzy_lexicon_path
+
+        # Grabación/reproducción de respuestas HTTP para benchmarks deterministas
+        self.cassette_path = cassette_path
+        self.cassette_modo = cassette_modo
+        self.cassette_latencia = cassette_latencia
+        # En replay, una petición no grabada lanza PeticionNoGrabada (False = responde 404)
+        self.cassette_estricto = cassette_estricto
+
+        # Caché persistente de embeddings de entidad (None = se codifican siempre)
+        self.embedding_cache_dir = embedding_cache_dir
+        self.embedding_cache_capacidad = embedding_cache_capacidad
+
+        # Índice denso de embeddings de entidades (None = solo candidatos léxicos)
+        self.dense_index_path = dense_index_path
+        self.dense_top_k = dense_top_k
@@ -1,9 +1,18 @@
 
-import spacy
+from .spacy_models import obtener_modelo
+
+MODELO_TOKENS = "blank:es"
+MODELO_SENTENCIAS = "es_core_news_lg"
+
+
+def __getattr__(nombre):
+    # Compatibilidad con `nlp_tokens` y `nlp_sentencias`, ahora cargados bajo demanda
+    if nombre == "nlp_tokens":
+        return obtener_modelo(MODELO_TOKENS)
+    if nombre == "nlp_sentencias":
+        return obtener_modelo(MODELO_SENTENCIAS)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
-# Cargar modelo para tokenización
-nlp_tokens = spacy.blank("es")
-nlp_sentencias = spacy.load("es_core_news_lg")
 
 def get_local_context(texto, start_char, ventana=5):
     '''
@@ -17,7 +26,7 @@ def get_local_context(texto, start_char, ventana=5):
     Returns:
         str: Contexto reducido.
     '''
-    doc = nlp_tokens(texto)
+    doc = obtener_modelo(MODELO_TOKENS)(texto)
     token_start_idx = None
 
     # Encontrar el token donde empieza la mención
@@ -33,11 +42,12 @@ def get_local_context(texto, start_char, ventana=5):
     end = min(len(doc), token_start_idx + ventana + 1)
     return doc[start:end].text
 
-def extraer_contexto_oracion(texto, start_char):
+def extraer_contexto_oracion(texto, start_char, model_name=MODELO_SENTENCIAS):
     """
     Extrae la oración donde aparece la mención, para usarla como contexto.
+    Usa la misma instancia del modelo que NERDetector si el nombre coincide.
     """
-    doc = nlp_sentencias(texto)
+    doc = obtener_modelo(model_name)(texto)
     for sent in doc.sents:
         if sent.start_char <= start_char <= sent.end_char:
             return sent.text
@@ -0,0 +1,120 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import pandas as pd
+
+from .rate_limit import RateLimiter
+
+
+class CorpusStore:
+    """
+    Almacén local de los textos del corpus de evaluación, indexado por docid.
+
+    Cada documento se guarda una sola vez como texto plano comprimido con zlib
+    en una tabla SQLite, junto con la URL de la que se extrajo. Permite evaluar
+    sin volver a descargar ni parsear las páginas de WikiNews, y sin red.
+    """
+    def __init__(self, path, nivel_compresion=6):
+        self.path = path
+        self.nivel_compresion = nivel_compresion
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    docid TEXT PRIMARY KEY,
+                    url TEXT,
+                    texto BLOB NOT NULL,
+                    descargado REAL NOT NULL
+                )
+            """)
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, docid, default=None):
+        """
+        Texto plano del documento, o `default` si no está en el almacén.
+        """
+        fila = self._conexion().execute("SELECT texto FROM documentos WHERE docid = ?", (str(docid),)).fetchone()
+        if fila is None:
+            return default
+        return zlib.decompress(fila[0]).decode("utf-8")
+
+    def set(self, docid, texto, url=None):
+        with self._conexion() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?)",
+                (str(docid), url, zlib.compress(texto.encode("utf-8"), self.nivel_compresion), time.time())
+            )
+
+    def __contains__(self, docid):
+        return self._conexion().execute(
+            "SELECT 1 FROM documentos WHERE docid = ?", (str(docid),)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM documentos").fetchone()[0]
+
+    def docids(self):
+        return [fila[0] for fila in self._conexion().execute("SELECT docid FROM documentos ORDER BY docid")]
+
+
+def materializar_corpus(docs_path, store_path, peticiones_por_segundo=1.0, max_docs=None):
+    """
+    Descarga una única vez cada URL de `docs.tsv` y guarda su texto extraído en
+    un CorpusStore. Los documentos ya guardados se saltan, así que se puede
+    relanzar tras una interrupción; los que salen vacíos no se guardan para
+    reintentarlos en la siguiente ejecución.
+
+    Returns:
+        dict: {"descargados", "existentes", "vacios"}
+    """
+    # Import diferido para evitar el ciclo evaluator -> corpus_store
+    from .evaluator import obtener_texto_de_url
+
+    docs = pd.read_csv(docs_path, sep="\t")
+    if max_docs:
+        docs = docs.head(max_docs)
+    store = CorpusStore(store_path)
+    rate_limiter = RateLimiter(peticiones_por_segundo)
+
+    resumen = {"descargados": 0, "existentes": 0, "vacios": 0}
+    for docid, url in zip(docs["docid"], docs["url"]):
+        if docid in store:
+            resumen["existentes"] += 1
+            continue
+        texto = obtener_texto_de_url(url, rate_limiter=rate_limiter)
+        if not texto.strip():
+            resumen["vacios"] += 1
+            print(f"[ERROR] Documento vacío: {docid}")
+            continue
+        store.set(docid, texto, url=url)
+        resumen["descargados"] += 1
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Descarga el corpus de evaluación a un almacén local comprimido.")
+    parser.add_argument("docs", help="TSV con las columnas docid y url")
+    parser.add_argument("store", help="Fichero SQLite de salida")
+    parser.add_argument("--peticiones-por-segundo", type=float, default=1.0, help="Ritmo máximo de descargas")
+    parser.add_argument("--max-docs", type=int, default=None, help="Número máximo de documentos")
+    args = parser.parse_args()
+
+    resumen = materializar_corpus(args.docs, args.store, args.peticiones_por_segundo, args.max_docs)
+    print(f"✅ {resumen['descargados']} descargados, {resumen['existentes']} ya existentes, "
+          f"{resumen['vacios']} vacíos → {args.store}")
+
+
+if __name__ == "__main__":
+    main()
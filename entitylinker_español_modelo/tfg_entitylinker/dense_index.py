@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from .text_utils import build_entity_text
+
+try:
+    import hnswlib
+except ImportError:  # búsqueda exacta con NumPy
+    hnswlib = None
+
+MODELO_POR_DEFECTO = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+FILAS_POR_BLOQUE = 65536  # filas de la matriz multiplicadas de una vez en la búsqueda exacta
+
+
+class DenseIndex:
+    """
+    Índice denso sobre embeddings precalculados de entidades (label + descripción),
+    generado con `construir_indice_denso`.
+
+    - `embeddings.npy` (float16, normalizados) y `qids.npy` se abren con
+      `np.load(mmap_mode="r")`, así que los procesos comparten el page cache.
+    - Si existe `hnsw.bin` y está instalado `hnswlib`, la búsqueda es aproximada (HNSW);
+      si no, se hace búsqueda exacta por bloques con NumPy, suficiente para KBs pequeñas.
+
+    Sirve para recuperar candidatos cuya forma superficial no es ningún alias conocido:
+    el embedding del contexto de la mención se compara con los de las entidades.
+    """
+    def __init__(self, directorio, ef=100):
+        with open(os.path.join(directorio, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.model_name = self.meta["model_name"]
+        self.embeddings = np.load(os.path.join(directorio, "embeddings.npy"), mmap_mode="r")
+        self.qids = np.load(os.path.join(directorio, "qids.npy"), mmap_mode="r")
+
+        self._hnsw = None
+        ruta_hnsw = os.path.join(directorio, "hnsw.bin")
+        if hnswlib is not None and os.path.exists(ruta_hnsw):
+            self._hnsw = hnswlib.Index(space="ip", dim=self.embeddings.shape[1])
+            self._hnsw.load_index(ruta_hnsw, max_elements=len(self.qids))
+            self._hnsw.set_ef(ef)
+
+    def __len__(self):
+        return len(self.qids)
+
+    def buscar(self, vector, k=10):
+        """
+        Devuelve [(qid, similitud)] de las `k` entidades más cercanas al vector, de mayor a menor similitud.
+        """
+        k = min(k, len(self.qids))
+        if k <= 0:
+            return []
+        consulta = np.asarray(vector, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        if norma == 0:
+            return []
+        consulta = consulta / norma
+
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(self._hnsw.ef, k))
+            filas, distancias = self._hnsw.knn_query(consulta, k=k)
+            indices, similitudes = filas[0], 1 - distancias[0]
+        else:
+            indices, similitudes = self._buscar_exacto(consulta, k)
+
+        return [(f"Q{self.qids[i]}", float(s)) for i, s in zip(indices, similitudes)]
+
+    def _buscar_exacto(self, consulta, k):
+        mejores_indices = np.empty(0, dtype=np.int64)
+        mejores_scores = np.empty(0, dtype=np.float32)
+        for inicio in range(0, len(self.qids), FILAS_POR_BLOQUE):
+            bloque = np.asarray(self.embeddings[inicio:inicio + FILAS_POR_BLOQUE], dtype=np.float32)
+            scores = bloque @ consulta
+            top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            mejores_indices = np.concatenate([mejores_indices, top + inicio])
+            mejores_scores = np.concatenate([mejores_scores, scores[top]])
+            if len(mejores_scores) > k:
+                top = np.argpartition(-mejores_scores, k - 1)[:k]
+                mejores_indices, mejores_scores = mejores_indices[top], mejores_scores[top]
+
+        orden = np.argsort(-mejores_scores, kind="stable")
+        return mejores_indices[orden], mejores_scores[orden]
+
+
+def construir_indice_denso(store_path, directorio, model_name=MODELO_POR_DEFECTO, lote=256,
+                           min_sitelinks=0, limite=None, hnsw=False):
+    """
+    Codifica las entidades de un almacén generado con `dump_store.ingerir_dump`
+    y guarda el índice denso en `directorio`.
+
+    Args:
+        store_path (str): Almacén SQLite local de Wikidata.
+        directorio (str): Directorio de salida.
+        model_name (str): Modelo de Sentence-Transformers; debe ser el mismo que usa el linker.
+        lote (int): Textos codificados por llamada al modelo.
+        min_sitelinks (int): Solo se indexan entidades con al menos estos sitelinks.
+        limite (int): Número máximo de entidades (las de más sitelinks primero).
+        hnsw (bool): Construir además el grafo HNSW (requiere `hnswlib`).
+
+    Returns:
+        int: Número de entidades indexadas.
+    """
+    # Import diferido: el modelo solo hace falta para construir el índice
+    from .semantic_similarity import SentenceEncoder, normalizar_embeddings
+
+    if hnsw and hnswlib is None:
+        raise ImportError("Para construir el índice HNSW hay que instalar hnswlib")
+
+    os.makedirs(directorio, exist_ok=True)
+    conn = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+    consulta = "SELECT qid, label, descripcion FROM entidades WHERE sitelinks >= ? ORDER BY sitelinks DESC, qid"
+    total = conn.execute(f"SELECT COUNT(*) FROM ({consulta})", (min_sitelinks,)).fetchone()[0]
+    if limite:
+        total = min(total, limite)
+    if total == 0:
+        conn.close()
+        raise ValueError(f"No hay entidades que indexar en {store_path}")
+
+    encoder = SentenceEncoder(model_name)
+    dim = encoder.model.get_sentence_embedding_dimension()
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(directorio, "embeddings.npy"), mode="w+", dtype=np.float16, shape=(total, dim)
+    )
+    qids = np.lib.format.open_memmap(
+        os.path.join(directorio, "qids.npy"), mode="w+", dtype=np.uint32, shape=(total,)
+    )
+
+    filas = conn.execute(consulta + " LIMIT ?", (min_sitelinks, total))
+    n = 0
+    while n < total:
+        bloque = filas.fetchmany(lote)
+        if not bloque:
+            break
+        textos = [build_entity_text(label=label, matched_alias=None, description=desc) for _, label, desc in bloque]
+        embeddings[n:n + len(bloque)] = normalizar_embeddings(encoder.encode(textos))
+        qids[n:n + len(bloque)] = [int(qid[1:]) for qid, _, _ in bloque]
+        n += len(bloque)
+        print(f"🧮 {n}/{total} entidades codificadas")
+    conn.close()
+    embeddings.flush()
+    qids.flush()
+
+    if hnsw:
+        indice = hnswlib.Index(space="ip", dim=dim)
+        indice.init_index(max_elements=total, ef_construction=200, M=16)
+        for inicio in range(0, total, FILAS_POR_BLOQUE):
+            bloque = np.asarray(embeddings[inicio:inicio + FILAS_POR_BLOQUE], dtype=np.float32)
+            indice.add_items(bloque, np.arange(inicio, inicio + len(bloque)))
+        indice.save_index(os.path.join(directorio, "hnsw.bin"))
+
+    with open(os.path.join(directorio, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "dim": dim, "n": total, "hnsw": hnsw}, f)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice denso de embeddings de entidades.")
+    parser.add_argument("store", help="Almacén SQLite generado con tfg_entitylinker.dump_store")
+    parser.add_argument("salida", help="Directorio de salida del índice")
+    parser.add_argument("--modelo", default=MODELO_POR_DEFECTO, help="Modelo de Sentence-Transformers")
+    parser.add_argument("--lote", type=int, default=256, help="Textos por llamada al modelo")
+    parser.add_argument("--min-sitelinks", type=int, default=0, help="Sitelinks mínimos de las entidades indexadas")
+    parser.add_argument("--limite", type=int, default=None, help="Número máximo de entidades")
+    parser.add_argument("--hnsw", action="store_true", help="Construir también el grafo HNSW (requiere hnswlib)")
+    args = parser.parse_args()
+
+    total = construir_indice_denso(args.store, args.salida, model_name=args.modelo, lote=args.lote,
+                                   min_sitelinks=args.min_sitelinks, limite=args.limite, hnsw=args.hnsw)
+    print(f"✅ Índice denso con {total} entidades guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
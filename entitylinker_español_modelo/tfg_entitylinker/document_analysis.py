@@ -0,0 +1,85 @@
+from bisect import bisect_left, bisect_right
+
+
+class DocumentAnalysis:
+    """
+    Resultado de analizar un texto una sola vez con spaCy: tokens, oraciones y
+    entidades con sus offsets de caracteres.
+
+    Todas las consultas de contexto y de tipo de una mención se resuelven con
+    búsqueda binaria sobre estos offsets, sin volver a procesar el texto.
+    """
+    def __init__(self, doc):
+        self.texto = doc.text
+        self.token_inicios = [t.idx for t in doc]
+        self.token_fines = [t.idx + len(t) for t in doc]
+
+        if doc.has_annotation("SENT_START"):
+            self.oraciones = [(s.start_char, s.end_char) for s in doc.sents]
+        else:
+            # Pipeline sin parser ni senter: el texto entero cuenta como una oración
+            self.oraciones = [(0, len(self.texto))]
+        self.oracion_fines = [fin for _, fin in self.oraciones]
+
+        # (texto_mencion, start_char, end_char, label), como NERDetector.detectar_menciones
+        self.entidades = [(e.text, e.start_char, e.end_char, e.label_) for e in doc.ents]
+
+    def indice_token(self, start_char):
+        """
+        Índice del token que contiene el carácter `start_char`, o None si cae en un espacio.
+        """
+        i = bisect_right(self.token_inicios, start_char) - 1
+        if i >= 0 and start_char < self.token_fines[i]:
+            return i
+        return None
+
+    def contexto_ventana(self, start_char, ventana=5):
+        """
+        Ventana de ±ventana tokens alrededor de la mención que empieza en start_char
+        (mismo resultado que `context_utils.get_local_context`).
+        """
+        i = self.indice_token(start_char)
+        if i is None:
+            return self.texto  # Fallback
+
+        inicio = max(0, i - ventana)
+        fin = min(len(self.token_inicios), i + ventana + 1)
+        return self.texto[self.token_inicios[inicio]:self.token_fines[fin - 1]]
+
+    def indice_oracion(self, start_char, incluir_fin=True):
+        """
+        Índice de la primera oración que contiene start_char, o None.
+        Con `incluir_fin` el final de la oración cuenta como parte de ella.
+        """
+        if incluir_fin:
+            i = bisect_left(self.oracion_fines, start_char)
+        else:
+            i = bisect_right(self.oracion_fines, start_char)
+        if i < len(self.oraciones) and self.oraciones[i][0] <= start_char:
+            return i
+        return None
+
+    def contexto_oracion(self, start_char):
+        """
+        Oración donde aparece la mención (mismo resultado que `context_utils.extraer_contexto_oracion`).
+        """
+        i = self.indice_oracion(start_char)
+        if i is None:
+            return self.texto  # Fallback si no se encuentra
+        inicio, fin = self.oraciones[i]
+        return self.texto[inicio:fin]
+
+    def tipo_mencion(self, mencion, start_char):
+        """
+        Tipo NER (PER, LOC, ORG...) de la mención: el de la primera entidad de su
+        oración con el mismo texto, o None si no se detecta.
+        """
+        i = self.indice_oracion(start_char, incluir_fin=False)
+        if i is None:
+            return None
+        inicio, fin = self.oraciones[i]
+        mencion_lower = mencion.lower()
+        for texto, start, end, tipo in self.entidades:
+            if start >= inicio and end <= fin and texto.lower() == mencion_lower:
+                return tipo
+        return None
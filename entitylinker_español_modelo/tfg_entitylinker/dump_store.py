@@ -0,0 +1,270 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import sqlite3
+import threading
+
+from .text_utils import normalizar_mencion
+
+LONGITUD_MINIMA_PREFIJO = 3  # por debajo, la búsqueda local solo hace match exacto
+MAX_NOMBRES_PREFIJO = 1000  # filas de `nombres` recorridas como máximo en una búsqueda por prefijo
+
+
+def abrir_dump(path):
+    """
+    Abre un dump JSON de Wikidata en modo texto, descomprimiendo .gz o .bz2 al vuelo.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def leer_entidades_dump(path):
+    """
+    Recorre el dump línea a línea (una entidad por línea dentro de un array JSON),
+    sin cargarlo entero en memoria. Solo devuelve items (QIDs).
+    """
+    with abrir_dump(path) as f:
+        for linea in f:
+            linea = linea.strip().rstrip(",")
+            if not linea or linea in ("[", "]"):
+                continue
+            entity = json.loads(linea)
+            if entity.get("type", "item") == "item" and entity.get("id", "").startswith("Q"):
+                yield entity
+
+
+def reducir_entidad(entity, language="es"):
+    """
+    Se queda solo con los campos que usa CandidateRetriever:
+    labels (el primero disponible, idioma principal e inglés, en ese orden), descripción
+    en el idioma principal, aliases multilingües, P31 y número de sitelinks.
+    """
+    labels = entity.get("labels", {})
+    idiomas_label = [lang for lang in list(labels)[:1] + [language, "en"] if lang in labels]
+    labels_reducidos = {lang: labels[lang].get("value", "") for lang in dict.fromkeys(idiomas_label)}
+    label_busqueda = (
+        labels_reducidos.get(language) or labels_reducidos.get("en")
+        or next(iter(labels_reducidos.values()), "")
+    )
+
+    aliases = {
+        lang: [a.get("value", "") for a in valores]
+        for lang, valores in entity.get("aliases", {}).items()
+    }
+
+    p31 = [
+        c["mainsnak"]["datavalue"]["value"]["id"]
+        for c in entity.get("claims", {}).get("P31", [])
+        if "datavalue" in c.get("mainsnak", {})
+    ]
+
+    return {
+        "qid": entity["id"],
+        "labels": labels_reducidos,
+        "label": label_busqueda,
+        "descripcion": entity.get("descriptions", {}).get(language, {}).get("value", ""),
+        "aliases": aliases,
+        "p31": p31,
+        "sitelinks": len(entity.get("sitelinks", {}))
+    }
+
+
+def ingerir_dump(dump_path, store_path, language="es", idiomas_busqueda=("es", "en"), lote=10000, limite=None):
+    """
+    Vuelca un dump JSON de Wikidata (.json, .json.gz o .json.bz2) a un almacén SQLite local.
+    Volver a ingerir en el mismo almacén actualiza las entidades sin duplicar sus nombres.
+
+    Args:
+        dump_path (str): Ruta del dump.
+        store_path (str): Fichero SQLite de salida (se crea si no existe).
+        language (str): Idioma de labels y descripciones principales.
+        idiomas_busqueda (tuple): Idiomas cuyos labels y aliases se indexan para la búsqueda.
+        lote (int): Entidades por transacción; acota la memoria usada.
+        limite (int): Número máximo de entidades a ingerir (útil para muestras).
+
+    Returns:
+        int: Número de entidades ingeridas.
+    """
+    conn = sqlite3.connect(store_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS entidades (
+            qid TEXT PRIMARY KEY,
+            labels TEXT, label TEXT,
+            descripcion TEXT, aliases TEXT, p31 TEXT,
+            sitelinks INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS nombres (
+            nombre TEXT NOT NULL, qid TEXT NOT NULL, sitelinks INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+        -- Almacenes anteriores sin clave única: se eliminan los duplicados antes de crearla
+        DELETE FROM nombres WHERE rowid NOT IN (SELECT MIN(rowid) FROM nombres GROUP BY nombre, qid);
+        CREATE UNIQUE INDEX IF NOT EXISTS nombres_unico ON nombres (nombre, qid);
+    """)
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('language', ?)", (language,))
+
+    filas_entidades = []
+    filas_nombres = []
+    total = 0
+
+    def volcar():
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO entidades VALUES (?, ?, ?, ?, ?, ?, ?)", filas_entidades)
+            conn.executemany("INSERT OR REPLACE INTO nombres VALUES (?, ?, ?)", filas_nombres)
+        filas_entidades.clear()
+        filas_nombres.clear()
+
+    for entity in leer_entidades_dump(dump_path):
+        reducida = reducir_entidad(entity, language)
+        filas_entidades.append((
+            reducida["qid"], json.dumps(reducida["labels"], ensure_ascii=False), reducida["label"],
+            reducida["descripcion"], json.dumps(reducida["aliases"], ensure_ascii=False),
+            json.dumps(reducida["p31"]), reducida["sitelinks"]
+        ))
+
+        nombres = {
+            normalizar_mencion(v.get("value", ""))
+            for lang, v in entity.get("labels", {}).items() if lang in idiomas_busqueda
+        }
+        for lang in idiomas_busqueda:
+            nombres.update(normalizar_mencion(a) for a in reducida["aliases"].get(lang, []))
+        filas_nombres.extend((n, reducida["qid"], reducida["sitelinks"]) for n in nombres if n)
+
+        total += 1
+        if len(filas_entidades) >= lote:
+            volcar()
+        if limite and total >= limite:
+            break
+
+    volcar()
+    conn.execute("CREATE INDEX IF NOT EXISTS nombres_nombre ON nombres (nombre, sitelinks DESC)")
+    conn.execute("ANALYZE")
+    conn.close()
+    return total
+
+
+class WikidataDumpStore:
+    """
+    Backend local de CandidateRetriever construido con `ingerir_dump`.
+
+    Implementa la misma interfaz que usa el retriever para hablar con la API
+    (`buscar` y `obtener_entidades`), pero sin red:
+    - `buscar` hace match exacto y por prefijo sobre labels y aliases normalizados,
+      ordenando por número de sitelinks, como aproximación a `wbsearchentities`.
+    - `obtener_entidades` devuelve las entidades con la forma JSON de Wikidata
+      reducida a los campos que usa el linker.
+    """
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No existe el almacén local de Wikidata: {path}")
+        self.path = path
+        self._local = threading.local()
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def buscar(self, mencion, language, offset, limit, max_nombres=MAX_NOMBRES_PREFIJO):
+        """
+        Devuelve (items, completo) con items de la forma {"id", "label"}.
+
+        Los matches exactos se devuelven siempre; los de prefijo se toman de las
+        `max_nombres` primeras filas del índice, para que una mención muy común
+        ("san", "los") no recorra media tabla.
+        """
+        nombre = normalizar_mencion(mencion)
+        if not nombre:
+            return [], True
+
+        if len(nombre) >= LONGITUD_MINIMA_PREFIJO:
+            prefijo = """
+                UNION ALL
+                SELECT * FROM (
+                    SELECT nombre, qid, sitelinks FROM nombres
+                    WHERE nombre > ? AND nombre < ? ORDER BY nombre LIMIT ?
+                )"""
+            args = (nombre, nombre + "\uffff", max_nombres)
+        else:
+            prefijo, args = "", ()
+
+        filas = self._conexion().execute(
+            f"""
+            SELECT n.qid, MIN(n.nombre != ?) AS parcial, MAX(n.sitelinks) AS sl, e.label
+            FROM (
+                SELECT nombre, qid, sitelinks FROM nombres WHERE nombre = ?{prefijo}
+            ) n JOIN entidades e ON e.qid = n.qid
+            GROUP BY n.qid
+            ORDER BY parcial, sl DESC, n.qid
+            LIMIT ? OFFSET ?
+            """,
+            (nombre, nombre, *args, limit + 1, offset)
+        ).fetchall()
+
+        items = [{"id": qid, "label": label} for qid, _, _, label in filas[:limit]]
+        return items, len(filas) <= limit
+
+    def obtener_entidades(self, qids):
+        """
+        Devuelve {qid: entity} para los QIDs presentes en el almacén.
+        """
+        if not qids:
+            return {}
+        marcas = ",".join("?" for _ in qids)
+        filas = self._conexion().execute(
+            f"SELECT qid, labels, descripcion, aliases, p31, sitelinks "
+            f"FROM entidades WHERE qid IN ({marcas})",
+            list(qids)
+        ).fetchall()
+        language = self._idioma()
+
+        entidades = {}
+        for qid, labels, descripcion, aliases, p31, sitelinks in filas:
+            entidades[qid] = {
+                "id": qid,
+                "labels": {lang: {"value": v} for lang, v in json.loads(labels).items()},
+                "descriptions": {language: {"value": descripcion}} if descripcion else {},
+                "aliases": {
+                    lang: [{"value": a} for a in valores]
+                    for lang, valores in json.loads(aliases).items()
+                },
+                "claims": {
+                    "P31": [{"mainsnak": {"datavalue": {"value": {"id": t}}}} for t in json.loads(p31)]
+                },
+                "sitelinks": sitelinks
+            }
+        return entidades
+
+    def _idioma(self):
+        idioma = getattr(self._local, "language", None)
+        if idioma is None:
+            fila = self._conexion().execute("SELECT valor FROM meta WHERE clave = 'language'").fetchone()
+            idioma = self._local.language = fila[0] if fila else "es"
+        return idioma
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de un dump JSON de Wikidata en un almacén SQLite local.")
+    parser.add_argument("dump", help="Ruta del dump (.json, .json.gz o .json.bz2)")
+    parser.add_argument("store", help="Fichero SQLite de salida")
+    parser.add_argument("--language", default="es", help="Idioma de labels y descripciones")
+    parser.add_argument("--idiomas-busqueda", nargs="+", default=["es", "en"], help="Idiomas indexados para la búsqueda")
+    parser.add_argument("--limite", type=int, default=None, help="Número máximo de entidades a ingerir")
+    args = parser.parse_args()
+
+    total = ingerir_dump(args.dump, args.store, language=args.language,
+                         idiomas_busqueda=tuple(args.idiomas_busqueda), limite=args.limite)
+    print(f"✅ {total} entidades ingeridas en {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+def hash_texto(texto):
+    """
+    Identificador de 63 bits del texto de entidad (cabe en un INTEGER de SQLite).
+    """
+    return int.from_bytes(hashlib.sha1(texto.encode("utf-8")).digest()[:8], "little") >> 1
+
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings de entidad compartida entre procesos.
+
+    - Los vectores se guardan en una matriz float16 mapeada en memoria
+      (`<modelo>.f16`) con `capacidad` filas; cada fila es un slot.
+    - Un índice SQLite (`<modelo>.sqlite`) asocia el hash del texto de entidad a
+      su slot y guarda el último acceso para expulsar por LRU cuando se llena.
+      Como en SQLiteCache, el acceso solo se actualiza si tiene más de
+      `refresco_acceso` segundos, para que los aciertos no escriban en cada lectura.
+    - Un array paralelo (`<modelo>.ids`) guarda el hash que ocupa cada slot; al
+      leer se comprueba, de modo que un slot reasignado por otro proceso a mitad
+      de lectura se trata como un fallo y no como un vector equivocado.
+
+    Hay un juego de ficheros por modelo, así que la clave efectiva es (modelo, hash del texto).
+    """
+    def __init__(self, directorio, model_name, dim, capacidad=200000, refresco_acceso=60.0):
+        os.makedirs(directorio, exist_ok=True)
+        base = os.path.join(directorio, re.sub(r"[^\w.-]+", "_", model_name))
+        self.dim = dim
+        self.capacidad = capacidad
+        self.refresco_acceso = refresco_acceso
+        self.indice_path = base + ".sqlite"
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        conn = self._conexion()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("CREATE TABLE IF NOT EXISTS slots (id INTEGER PRIMARY KEY, slot INTEGER UNIQUE NOT NULL, acceso REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS slots_acceso ON slots (acceso)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?), ('capacidad', ?)", (dim, capacidad))
+            meta = dict(conn.execute("SELECT clave, valor FROM meta").fetchall())
+            if meta["dim"] != dim or meta["capacidad"] != capacidad:
+                raise ValueError(
+                    f"La caché de embeddings {base} se creó con dim={meta['dim']} y "
+                    f"capacidad={meta['capacidad']}, no con dim={dim} y capacidad={capacidad}"
+                )
+            # Los ficheros se crean bajo el lock de escritura de SQLite
+            self._matriz = self._abrir_memmap(base + ".f16", np.float16, (capacidad, dim))
+            self._ids = self._abrir_memmap(base + ".ids", np.int64, (capacidad,))
+
+    @staticmethod
+    def _abrir_memmap(path, dtype, forma):
+        modo = "r+" if os.path.exists(path) else "w+"
+        return np.memmap(path, dtype=dtype, mode=modo, shape=forma)
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.indice_path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def buscar(self, textos):
+        """
+        Devuelve {texto: vector float32} para los textos que están en caché.
+        """
+        ids = {hash_texto(t): t for t in textos}
+        if not ids:
+            return {}
+        conn = self._conexion()
+        marcas = ",".join("?" for _ in ids)
+        filas = conn.execute(f"SELECT id, slot, acceso FROM slots WHERE id IN ({marcas})", list(ids)).fetchall()
+
+        ahora = time.time()
+        encontrados = {}
+        refrescar = []
+        for id_texto, slot, acceso in filas:
+            vector = np.array(self._matriz[slot], dtype=np.float32)
+            if self._ids[slot] == id_texto:
+                encontrados[ids[id_texto]] = vector
+                if ahora - acceso > self.refresco_acceso:
+                    refrescar.append((ahora, id_texto))
+
+        if refrescar:
+            conn.executemany("UPDATE slots SET acceso = ? WHERE id = ?", refrescar)
+        self.hits += len(encontrados)
+        self.misses += len(ids) - len(encontrados)
+        return encontrados
+
+    def guardar(self, textos, vectores):
+        """
+        Guarda los vectores de los textos, reutilizando los slots menos usados si la caché está llena.
+        """
+        conn = self._conexion()
+        ahora = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Los slots se ocupan en orden (0, 1, ...) y no se liberan, así que basta
+            # contarlos una vez por transacción, con el lock de escritura ya tomado
+            ocupados = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            for texto, vector in zip(textos, vectores):
+                id_texto = hash_texto(texto)
+                fila = conn.execute("SELECT slot FROM slots WHERE id = ?", (id_texto,)).fetchone()
+                if fila is not None:
+                    slot = fila[0]
+                else:
+                    if ocupados < self.capacidad:
+                        slot = ocupados
+                        ocupados += 1
+                    else:
+                        id_viejo, slot = conn.execute("SELECT id, slot FROM slots ORDER BY acceso LIMIT 1").fetchone()
+                        conn.execute("DELETE FROM slots WHERE id = ?", (id_viejo,))
+
+                # Se invalida el slot antes de sobrescribir el vector
+                self._ids[slot] = 0
+                self._matriz[slot] = np.asarray(vector, dtype=np.float16)
+                self._ids[slot] = id_texto
+                conn.execute("INSERT OR REPLACE INTO slots (id, slot, acceso) VALUES (?, ?, ?)", (id_texto, slot, ahora))
+            self._matriz.flush()
+            self._ids.flush()
+
+    def __len__(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entradas": len(self)}
@@ -1,34 +1,24 @@
-import requests
+import json
+import os
+import time
+
+import numpy as np
 import pandas as pd
 from bs4 import BeautifulSoup
-from time import sleep
 
+from .candidate_retrieval import safe_get
+from .cassette import PeticionNoGrabada
+from .corpus_store import CorpusStore
+from .rate_limit import RateLimiter
 
-def safe_get(url, max_retries=5, backoff_seconds=30):
-    """
-    Hace una petición GET segura.
-    Si recibe 429 (rate limit) o 503 (timeout), espera y reintenta.
-    """
-    for intento in range(max_retries):
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            return resp
-        elif resp.status_code in [429, 503]:
-            print(f"[RATE LIMIT] Esperando {backoff_seconds}s por error {resp.status_code} en {url}")
-            sleep(backoff_seconds)
-        else:
-            print(f"[ERROR] {resp.status_code} al acceder a {url}")
-            break
-    raise RuntimeError(f"[FATAL] Fallos repetidos accediendo a {url} (último status: {resp.status_code})")
-
-
-def obtener_texto_de_url(url: str) -> str:
+
+def obtener_texto_de_url(url: str, rate_limiter=None) -> str:
     """
     Descarga el contenido de la URL de WikiNews y devuelve el texto plano del artículo.
-    Usa safe_get para manejar errores 429/503.
+    Usa safe_get para manejar errores 429/503 y, si se indica, el ritmo de `rate_limiter`.
     """
     try:
-        resp = safe_get(url)
+        resp = safe_get(url, rate_limiter=rate_limiter)
         soup = BeautifulSoup(resp.text, "html.parser")
         contenido = soup.find("div", class_="mw-parser-output")
         if not contenido:
@@ -44,50 +34,63 @@ def obtener_texto_de_url(url: str) -> str:
 
 
 class Evaluator:
-    def __init__(self, linker, mentions_path="mentions.tsv", docs_path="docs.tsv"):
+    def __init__(self, linker, mentions_path="mentions.tsv", docs_path="docs.tsv", peticiones_por_segundo=1.0,
+                 corpus_path=None, solo_local=False):
+        """
+        Args:
+            corpus_path (str): CorpusStore con los textos ya descargados (ver
+                `corpus_store.materializar_corpus`); los que falten se descargan y se guardan.
+            solo_local (bool): No descargar nada; los documentos que no estén en el almacén se tratan como vacíos.
+        """
         self.linker = linker
+        self.rate_limiter = RateLimiter(peticiones_por_segundo)
         self.mentions = pd.read_csv(mentions_path, sep="\t")
         self.docs = pd.read_csv(docs_path, sep="\t")
         self.docid_to_url = dict(zip(self.docs["docid"], self.docs["url"]))
+        # Menciones agrupadas por docid una sola vez, en orden de aparición
+        self.menciones_por_doc = dict(tuple(self.mentions.groupby("docid", sort=False)))
+        self.corpus = CorpusStore(corpus_path) if corpus_path else None
+        self.solo_local = solo_local
 
-    def evaluate(self, max_docs=None, verbose=True, delay=1):
-        docids = self.mentions["docid"].unique()
-        if max_docs:
-            docids = docids[:max_docs]
-
-        total = 0
-        aciertos = 0
-        mrr_total = 0
-        errores = 0
-        errores_doc = 0
-
-        for docid in docids:
-            url = self.docid_to_url.get(docid)
-            if not url:
-                continue
-
-            texto = obtener_texto_de_url(url)
-            if not texto.strip():
-                errores += 1
-                print(f"[ERROR] Documento vacío: {docid}")
-                continue
-
-            self.linker.entidades_previas = []  # Reset por documento
-            if verbose:
-                print(f"\n📄 Procesando documento: {docid}")
+    def obtener_texto(self, docid):
+        """
+        Texto del documento: del almacén local si está, si no de WikiNews.
+        Devuelve None si el docid no tiene URL.
+        """
+        if self.corpus is not None:
+            texto = self.corpus.get(docid)
+            if texto is not None:
+                return texto
+            if self.solo_local:
+                return ""
 
-            menciones_doc = self.mentions[self.mentions["docid"] == docid]
-
-            aciertos_doc = 0
-            total_doc = 0
-            errores_doc = 0
+        url = self.docid_to_url.get(docid)
+        if not url:
+            return None
+        texto = obtener_texto_de_url(url, rate_limiter=self.rate_limiter)
+        if self.corpus is not None and texto.strip():
+            self.corpus.set(docid, texto, url=url)
+        return texto
 
-            for _, row in menciones_doc.iterrows():
-                mention = row["mention"]
-                qid_gold = row["qid"]
-                pos = row["position"]
-                length = row["length"]
+    def _enlazar_documento(self, texto, menciones_doc):
+        """
+        Enlaza todas las menciones gold de un documento en una sola llamada a `link_mentions`.
+        Si falla, se repite mención a mención para contar solo las que dan error.
+        Una `PeticionNoGrabada` no cuenta como error del linker: se propaga y detiene la evaluación.
 
+        Returns:
+            list: (resultado, ranking de QIDs candidatos, error) por fila de `menciones_doc`, en el mismo orden.
+        """
+        spans = [(row["mention"], row["position"], row["length"]) for _, row in menciones_doc.iterrows()]
+        try:
+            resultados, rankings = self.linker.link_mentions(texto, spans, devolver_ranking=True)
+            return [(resultado, ranking, None) for resultado, ranking in zip(resultados, rankings)]
+        except PeticionNoGrabada:
+            raise
+        except Exception:
+            self.linker.entidades_previas = []
+            resultados = []
+            for mention, pos, length in spans:
                 try:
                     resultado = self.linker.link_mention_with_context(
                         mention=mention,
@@ -95,55 +98,283 @@ class Evaluator:
                         start=pos,
                         length=length
                     )
+                    resultados.append((resultado, self.linker.ultimo_ranking, None))
+                except PeticionNoGrabada:
+                    raise
                 except Exception as e:
-                    print(f"[ERROR] Fallo con '{mention}' en {docid}: {e}")
-                    errores += 1
-                    errores_doc += 1
+                    resultados.append((None, [], e))
+            return resultados
+
+    def docids(self, max_docs=None):
+        """
+        Docids del fichero de menciones en orden de aparición (los `max_docs` primeros si se indica).
+        """
+        docids = list(self.menciones_por_doc)
+        return docids[:max_docs] if max_docs else docids
+
+    def evaluar_documento(self, docid, verbose=True):
+        """
+        Enlaza las menciones gold de un documento y devuelve una fila por mención
+        (ver `calcular_metricas`), o una sola fila de error si el documento está vacío.
+        Devuelve None si el docid no tiene URL.
+        """
+        texto = self.obtener_texto(docid)
+        if texto is None:
+            return None
+
+        if not texto.strip():
+            print(f"[ERROR] Documento vacío: {docid}")
+            return [
+                {"docid": _a_json(docid), "mention": None, "error": "Documento vacío"},
+                {"docid": _a_json(docid), "fin": True, "menciones": 0, "latencia": 0.0, "peticiones_http": 0,
+                 "llamadas_encoder": 0}
+            ]
+
+        self.linker.entidades_previas = []  # Reset por documento
+        if verbose:
+            print(f"\n📄 Procesando documento: {docid}")
+
+        menciones_doc = self.menciones_por_doc[docid]
+        peticiones_antes = self._peticiones_http()
+        encoder_antes = self._llamadas_encoder()
+        inicio = time.perf_counter()
+        resultados = self._enlazar_documento(texto, menciones_doc)
+        latencia = time.perf_counter() - inicio
+        peticiones = self._peticiones_http() - peticiones_antes
+        llamadas_encoder = self._llamadas_encoder() - encoder_antes
+        n = max(len(menciones_doc), 1)
+
+        filas = []
+        for (_, row), (resultado, ranking, error) in zip(menciones_doc.iterrows(), resultados):
+            mention = row["mention"]
+            qid_gold = row["qid"]
+            # Posición (desde 1) del QID gold entre los candidatos puntuados, o None si no se recuperó
+            rango_gold = ranking.index(qid_gold) + 1 if qid_gold in ranking else None
+            fila = {
+                "docid": _a_json(docid),
+                "mention": mention,
+                "position": _a_json(row["position"]),
+                "length": _a_json(row["length"]),
+                "qid_gold": qid_gold,
+                "qid_predicho": resultado["qid"] if resultado else None,
+                "score": round(float(resultado["score"]), 3) if resultado else None,
+                "rango_gold": rango_gold,
+                "candidatos": len(ranking),
+                # Las menciones de un documento se enlazan juntas: latencia y peticiones repartidas
+                "latencia": latencia / n,
+                "peticiones_http": peticiones / n,
+                "error": None
+            }
+            filas.append(fila)
+
+            if error is not None:
+                print(f"[ERROR] Fallo con '{mention}' en {docid}: {error}")
+                fila["error"] = str(error)
+                continue
+
+            if verbose:
+                predicho = fila["qid_predicho"]
+                simbolo = "✅" if predicho == qid_gold else "❌"
+                print(f"{simbolo} {mention} → {predicho} (esperado: {qid_gold})")
+
+        # Fila de cierre: marca el documento como terminado en el fichero de resultados
+        filas.append({"docid": _a_json(docid), "fin": True, "menciones": len(menciones_doc),
+                      "latencia": latencia, "peticiones_http": peticiones, "llamadas_encoder": llamadas_encoder})
+        return filas
+
+    def _peticiones_http(self):
+        """
+        Peticiones hechas hasta ahora por el transporte del retriever (0 si no las cuenta).
+        """
+        return getattr(self.linker.retriever.transport, "peticiones", 0)
+
+    def _llamadas_encoder(self):
+        """
+        Llamadas hechas hasta ahora al modelo de Sentence-Transformers (los aciertos de caché no cuentan).
+        """
+        return getattr(self.linker.encoder, "llamadas", 0)
+
+    def evaluate(self, max_docs=None, verbose=True, docids=None, resultados_path=None, reanudar=False, delay=None):
+        """
+        Evalúa los documentos (todos, los `max_docs` primeros o los `docids` indicados).
+
+        Si se indica `resultados_path`, las filas de cada documento (una por mención
+        más una fila de cierre) se añaden a ese JSONL y se sincronizan a disco
+        (fsync) al terminar el documento. Con `reanudar`, los documentos ya
+        cerrados en el fichero se saltan y las métricas finales se recalculan a
+        partir del fichero completo.
+
+        `delay` (pausa fija entre documentos) está obsoleto y se ignora: el ritmo
+        de peticiones lo controla ahora el RateLimiter (`peticiones_por_segundo`).
+        """
+        if delay:
+            print("⚠️ Evaluator.evaluate(delay=...) está obsoleto y se ignora; "
+                  "usa peticiones_por_segundo en ConfigEL para limitar el ritmo de peticiones")
+        if docids is None:
+            docids = self.docids(max_docs)
+
+        filas_totales = []
+        hechos = set()
+        if resultados_path and reanudar:
+            filas_totales, hechos = cargar_resultados(resultados_path)
+            if hechos:
+                print(f"⏩ Reanudando: {len(hechos)} documentos ya evaluados en {resultados_path}")
+
+        acumulado = calcular_metricas(filas_totales)
+        salida = open(resultados_path, "a" if reanudar else "w", encoding="utf-8") if resultados_path else None
+        try:
+            for docid in docids:
+                if _a_json(docid) in hechos:
+                    continue
+                filas = self.evaluar_documento(docid, verbose=verbose)
+                if filas is None:
                     continue
+                filas_totales.extend(filas)
+                if salida is not None:
+                    salida.write("".join(json.dumps(f, ensure_ascii=False) + "\n" for f in filas))
+                    salida.flush()
+                    os.fsync(salida.fileno())
+
+                # Accuracy por documento y total
+                doc = calcular_metricas(filas)
+                acumulado = {k: acumulado[k] + doc[k] for k in ("evaluadas", "aciertos", "errores")}
+                if filas[0]["mention"] is None:
+                    continue
+                acc_doc = (doc["aciertos"] / doc["evaluadas"]) * 100 if doc["evaluadas"] > 0 else 0
+                acc_total = (acumulado["aciertos"] / acumulado["evaluadas"]) * 100 if acumulado["evaluadas"] > 0 else 0
+                print(f"📄 Doc terminado: {docid} → "
+                      f"aciertos: {doc['aciertos']}/{doc['evaluadas']} ({acc_doc:.2f}%) | "
+                      f"acumulado: {acumulado['aciertos']}/{acumulado['evaluadas']} ({acc_total:.2f}%) | "
+                      f"errores este doc: {doc['errores']} | errores totales: {acumulado['errores']}")
+        finally:
+            if salida is not None:
+                salida.close()
+
+        if resultados_path:
+            filas_totales, _ = cargar_resultados(resultados_path)
+        metricas = calcular_metricas(filas_totales)
+        imprimir_metricas(metricas)
+        return metricas
+
+
+def cargar_resultados(path):
+    """
+    Lee un fichero de resultados de `Evaluator.evaluate`.
+
+    Solo cuentan los documentos con fila de cierre: si la ejecución se cortó a
+    mitad de un documento (o de una línea), esas filas se descartan y el fichero
+    se reescribe sin ellas para poder seguir añadiendo.
+
+    Returns:
+        tuple: (filas de los documentos terminados, set de docids terminados)
+    """
+    if not os.path.exists(path):
+        return [], set()
+
+    filas = []
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                filas.append(json.loads(linea))
+            except ValueError:
+                break  # línea a medio escribir
+
+    hechos = {fila["docid"] for fila in filas if fila.get("fin")}
+    completas = [fila for fila in filas if fila["docid"] in hechos]
+    if len(completas) != len(filas) or _tiene_cola_incompleta(path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(fila, ensure_ascii=False) + "\n" for fila in completas))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    return completas, hechos
+
+
+def _tiene_cola_incompleta(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def _a_json(valor):
+    # pandas devuelve enteros de NumPy, que json no serializa
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+KS_RECALL = (1, 5, 10)
+
+
+def calcular_metricas(filas):
+    """
+    Métricas agregadas a partir de las filas por mención de `Evaluator.evaluar_documento`
+    (las mismas tanto para una ejecución completa como para la fusión de shards).
+    Las filas con error (menciones que fallan y documentos vacíos) solo cuentan como errores.
+
+    El MRR y el recall@k usan la posición del QID gold en el ranking de candidatos
+    puntuados (`rango_gold`), aunque el enlace final no supere el umbral. El coste
+    (peticiones HTTP, llamadas al encoder y latencia por documento) sale de las
+    filas de cierre.
+    """
+    total = 0
+    aciertos = 0
+    errores = 0
+    suma_rr = 0.0
+    en_top = {k: 0 for k in KS_RECALL}
+    peticiones = 0
+    llamadas_encoder = 0
+    latencias = []
+    for fila in filas:
+        if fila.get("fin"):
+            peticiones += fila.get("peticiones_http", 0)
+            llamadas_encoder += fila.get("llamadas_encoder", 0)
+            if fila.get("menciones"):
+                latencias.append(fila["latencia"])
+            continue
+        if fila.get("error"):
+            errores += 1
+            continue
+        total += 1
+        acierto = fila["qid_predicho"] is not None and fila["qid_predicho"] == fila["qid_gold"]
+        if acierto:
+            aciertos += 1
+        # Resultados antiguos sin ranking: solo se sabe si el gold quedó primero
+        rango = fila.get("rango_gold", 1 if acierto else None)
+        if rango:
+            suma_rr += 1.0 / rango
+            for k in KS_RECALL:
+                en_top[k] += rango <= k
+
+    menciones = total + errores
+    metricas = {
+        "accuracy@1": round(aciertos / total, 4) if total > 0 else 0,
+        "MRR": round(suma_rr / total, 4) if total > 0 else 0,
+    }
+    for k in KS_RECALL:
+        metricas[f"recall@{k}"] = round(en_top[k] / total, 4) if total > 0 else 0
+    metricas.update({
+        "evaluadas": total,
+        "aciertos": aciertos,
+        "errores": errores,
+        "peticiones_http_por_mencion": round(peticiones / menciones, 3) if menciones else 0,
+        "llamadas_encoder": llamadas_encoder,
+        "latencia_p50": round(float(np.percentile(latencias, 50)), 4) if latencias else 0,
+        "latencia_p95": round(float(np.percentile(latencias, 95)), 4) if latencias else 0
+    })
+    return metricas
+
 
-                total += 1
-                total_doc += 1
-                if resultado:
-                    predicho = resultado["qid"]
-                    if predicho == qid_gold:
-                        aciertos += 1
-                        aciertos_doc += 1
-                        mrr_total += 1
-                    else:
-                        mrr_total += 0
-                    if verbose:
-                        acierto = predicho == qid_gold
-                        simbolo = "✅" if acierto else "❌"
-                        print(f"{simbolo} {mention} → {predicho} (esperado: {qid_gold})")
-                else:
-                    if verbose:
-                        print(f"❌ {mention} → None (esperado: {qid_gold})")
-
-            if delay:
-                sleep(delay)
-
-            # Accuracy por documento y total
-            acc_doc = (aciertos_doc / total_doc) * 100 if total_doc > 0 else 0
-            acc_total = (aciertos / total) * 100 if total > 0 else 0
-
-            print(f"📄 Doc terminado: {docid} → "
-                  f"aciertos: {aciertos_doc}/{total_doc} ({acc_doc:.2f}%) | "
-                  f"acumulado: {aciertos}/{total} ({acc_total:.2f}%) | "
-                  f"errores este doc: {errores_doc} | errores totales: {errores}")
-
-        accuracy = aciertos / total if total > 0 else 0
-        mrr = mrr_total / total if total > 0 else 0
-
-        print("\n==== RESULTADOS ====")
-        print(f"Total menciones evaluadas: {total}")
-        print(f"Aciertos exactos (top1): {aciertos}")
-        print(f"Accuracy@1: {accuracy:.4f}")
-        print(f"MRR: {mrr:.4f}")
-        print(f"Errores o vacíos: {errores}")
-
-        return {
-            "accuracy@1": round(accuracy, 4),
-            "MRR": round(mrr, 4),
-            "evaluadas": total,
-            "errores": errores
-        }
+def imprimir_metricas(metricas):
+    print("\n==== RESULTADOS ====")
+    print(f"Total menciones evaluadas: {metricas['evaluadas']}")
+    print(f"Aciertos exactos (top1): {metricas['aciertos']}")
+    print(f"Accuracy@1: {metricas['accuracy@1']:.4f}")
+    print(f"MRR: {metricas['MRR']:.4f}")
+    print("Recall: " + " | ".join(f"@{k} {metricas[f'recall@{k}']:.4f}" for k in KS_RECALL))
+    print(f"Errores o vacíos: {metricas['errores']}")
+    print(f"Peticiones HTTP por mención: {metricas['peticiones_http_por_mencion']:.3f}")
+    print(f"Llamadas al encoder: {metricas['llamadas_encoder']}")
+    print(f"Latencia por documento: p50 {metricas['latencia_p50']:.3f}s | p95 {metricas['latencia_p95']:.3f}s")
@@ -0,0 +1,240 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from .lexicon import Lexicon
+from .text_utils import normalizar_mencion
+
+MAGIC = b"TFGFUZ01"
+# magic, n_gramas, n_postings, offsets de: offsets_gramas, offsets_postings, postings, blob
+CABECERA = struct.Struct("<8sQQQQQQ")
+N = 3  # tamaño de los n-gramas de caracteres
+
+# Artículos y preposiciones que el NER suele incluir al principio de la mención.
+# Tienen que ir seguidos de un espacio (o ser "l'") para no recortar nombres
+# como "Alicante" o "Elche"; las alternativas largas van primero.
+ARTICULOS = re.compile(r"^(?:de\s+las?|de\s+los|del|de|el|las?|los|lo|al)\s+|^l['’]\s*", re.IGNORECASE)
+
+
+def limpiar_mencion(mencion):
+    """
+    Normaliza la mención y elimina los artículos iniciales ("la Generalitat Valenciana").
+    """
+    normalizada = normalizar_mencion(mencion)
+    sin_articulo = ARTICULOS.sub("", normalizada, count=1)
+    return sin_articulo or normalizada
+
+
+def variantes_mencion(mencion):
+    """
+    Formas de la mención que se comparan con el léxico: normalizada y sin artículo.
+    Hace falta la primera para los nombres que empiezan por artículo ("El Salvador", "La Rioja").
+    """
+    normalizada = normalizar_mencion(mencion)
+    return list(dict.fromkeys(v for v in (normalizada, limpiar_mencion(mencion)) if v))
+
+
+def ngramas(texto, n=N):
+    """
+    Conjunto de n-gramas de caracteres del texto con relleno en los extremos.
+    """
+    relleno = f" {texto} "
+    return {relleno[i:i + n] for i in range(max(1, len(relleno) - n + 1))}
+
+
+def distancia_edicion(a, b, maximo):
+    """
+    Distancia de Levenshtein entre `a` y `b`, cortando en cuanto supera `maximo`
+    (en ese caso devuelve maximo + 1).
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+
+class FuzzyIndex:
+    """
+    Índice aproximado sobre las claves de un Lexicon, basado en listas invertidas
+    de trigramas de caracteres (fichero binario mapeado en memoria).
+
+    Para una mención con erratas, sin tildes o con artículos de más:
+    1) se recuperan las claves que comparten trigramas con ella, ignorando los
+       trigramas demasiado frecuentes (`max_postings_grama`),
+    2) se verifican como mucho `max_verificaciones` claves con distancia de
+       edición acotada,
+    3) se devuelven los QIDs de las claves aceptadas, ordenados por distancia y sitelinks.
+    Así el coste de cada consulta está acotado independientemente del tamaño del léxico.
+
+    `lexicon` es el Lexicon (o la ruta del léxico) sobre el que se construyó el
+    índice; si se pasa una ruta, el léxico se abre aquí y se cierra con `close`.
+    """
+    def __init__(self, path, lexicon, max_postings_grama=50000, max_verificaciones=200):
+        self.path = path
+        self._lexicon_propio = not isinstance(lexicon, Lexicon)
+        self.lexicon = Lexicon(lexicon) if self._lexicon_propio else lexicon
+        self.max_postings_grama = max_postings_grama
+        self.max_verificaciones = max_verificaciones
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.n_gramas, self.n_postings, off_gramas, off_postings,
+         off_lista, self._off_blob) = CABECERA.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un índice aproximado de tfg_entitylinker")
+
+        vista = memoryview(self._mm)
+        self._offsets_gramas = vista[off_gramas:off_gramas + 8 * (self.n_gramas + 1)].cast("Q")
+        self._offsets_postings = vista[off_postings:off_postings + 8 * (self.n_gramas + 1)].cast("Q")
+        self._postings = vista[off_lista:off_lista + 4 * self.n_postings].cast("I")
+        # Los trigramas (pocos miles) se cargan en memoria para buscarlos con bisect
+        self._gramas = [
+            self._mm[self._off_blob + self._offsets_gramas[i]:self._off_blob + self._offsets_gramas[i + 1]]
+            for i in range(self.n_gramas)
+        ]
+
+    def _claves_con_grama(self, grama):
+        objetivo = grama.encode("utf-8")
+        i = bisect_left(self._gramas, objetivo)
+        if i >= self.n_gramas or self._gramas[i] != objetivo:
+            return None
+        return self._postings[self._offsets_postings[i]:self._offsets_postings[i + 1]]
+
+    def buscar_claves(self, mencion, max_distancia=None):
+        """
+        Devuelve [(clave, distancia)] de las claves del léxico cercanas a la mención,
+        con o sin sus artículos iniciales (para cada clave, la menor distancia).
+        Por defecto se admite una edición por cada 4 caracteres (mínimo 1, máximo 3).
+        """
+        mejores = {}
+        for consulta in variantes_mencion(mencion):
+            for clave, distancia in self._buscar_consulta(consulta, max_distancia):
+                if distancia < mejores.get(clave, distancia + 1):
+                    mejores[clave] = distancia
+        return sorted(mejores.items(), key=lambda x: x[1])
+
+    def _buscar_consulta(self, consulta, max_distancia=None):
+        if max_distancia is None:
+            max_distancia = min(3, max(1, len(consulta) // 4))
+
+        gramas = ngramas(consulta)
+        coincidencias = Counter()
+        consultados = 0
+        for grama in gramas:
+            claves = self._claves_con_grama(grama)
+            if claves is not None and len(claves) > self.max_postings_grama:
+                continue
+            # Un trigrama que no está en el índice cuenta: ninguna clave lo comparte
+            consultados += 1
+            if claves is not None:
+                coincidencias.update(claves)
+
+        # Cada edición destruye como mucho N trigramas; los descartados por
+        # frecuentes no se han contado, así que no pueden exigirse
+        minimo = max(1, consultados - N * max_distancia)
+        aceptadas = []
+        for indice, comunes in coincidencias.most_common(self.max_verificaciones):
+            if comunes < minimo:
+                break
+            clave = self.lexicon.clave(indice)
+            distancia = distancia_edicion(consulta, clave, max_distancia)
+            if distancia <= max_distancia:
+                aceptadas.append((clave, distancia))
+        return aceptadas
+
+    def buscar(self, mencion, language, offset, limit):
+        """
+        Interfaz de búsqueda de CandidateRetriever. Devuelve (items, completo).
+        """
+        mejores = {}
+        for clave, distancia in self.buscar_claves(mencion):
+            for qid, sitelinks in self.lexicon.buscar_exacto(clave):
+                if qid not in mejores or (distancia, -sitelinks) < mejores[qid]:
+                    mejores[qid] = (distancia, -sitelinks)
+
+        qids = sorted(mejores, key=lambda q: mejores[q])
+        pagina = qids[offset:offset + limit]
+        return [{"id": qid, "label": ""} for qid in pagina], offset + limit >= len(qids)
+
+    def close(self):
+        for vista in (self._offsets_gramas, self._offsets_postings, self._postings):
+            vista.release()
+        self._mm.close()
+        if self._lexicon_propio:
+            self.lexicon.close()
+
+
+def construir_fuzzy(lexicon_path, salida_path):
+    """
+    Construye el índice de trigramas sobre todas las claves de un léxico.
+    Las listas invertidas se acumulan en memoria como arrays de enteros de 32 bits.
+
+    Returns:
+        tuple: (n_gramas, n_postings)
+    """
+    lexicon = Lexicon(lexicon_path)
+    invertido = defaultdict(lambda: array("I"))
+    for i in range(lexicon.n_claves):
+        for grama in ngramas(lexicon.clave(i)):
+            invertido[grama].append(i)
+
+    gramas = sorted(invertido, key=lambda g: g.encode("utf-8"))
+    blob = bytearray()
+    offsets_gramas = array("Q", [0])
+    offsets_postings = array("Q", [0])
+    for grama in gramas:
+        blob += grama.encode("utf-8")
+        offsets_gramas.append(len(blob))
+        offsets_postings.append(offsets_postings[-1] + len(invertido[grama]))
+    n_postings = offsets_postings[-1]
+
+    def alinear(pos):
+        return (pos + 7) // 8 * 8
+
+    off_gramas = alinear(CABECERA.size)
+    off_postings = alinear(off_gramas + 8 * (len(gramas) + 1))
+    off_lista = alinear(off_postings + 8 * (len(gramas) + 1))
+    off_blob = alinear(off_lista + 4 * n_postings)
+
+    tmp_salida = salida_path + ".tmp"
+    with open(tmp_salida, "wb") as out:
+        out.write(CABECERA.pack(MAGIC, len(gramas), n_postings, off_gramas, off_postings, off_lista, off_blob))
+        out.write(b"\0" * (off_gramas - out.tell()))
+        offsets_gramas.tofile(out)
+        out.write(b"\0" * (off_postings - out.tell()))
+        offsets_postings.tofile(out)
+        out.write(b"\0" * (off_lista - out.tell()))
+        for grama in gramas:
+            invertido[grama].tofile(out)
+        out.write(b"\0" * (off_blob - out.tell()))
+        out.write(bytes(blob))
+    os.replace(tmp_salida, salida_path)
+    lexicon.close()
+
+    return len(gramas), n_postings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice aproximado de trigramas sobre un léxico.")
+    parser.add_argument("lexicon", help="Léxico generado con tfg_entitylinker.lexicon")
+    parser.add_argument("salida", help="Fichero binario de salida")
+    args = parser.parse_args()
+
+    n_gramas, n_postings = construir_fuzzy(args.lexicon, args.salida)
+    print(f"✅ Índice aproximado con {n_gramas} trigramas y {n_postings} entradas guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import heapq
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from .dump_store import LONGITUD_MINIMA_PREFIJO
+from .text_utils import normalizar_mencion
+
+MAGIC = b"TFGLEX01"
+# magic, n_claves, n_postings, offsets de: offsets_claves, offsets_postings, qids, sitelinks, blob
+CABECERA = struct.Struct("<8sQQQQQQQ")
+MAX_CLAVES_PREFIJO = 1000  # claves recorridas como máximo en una búsqueda por prefijo
+
+
+class _Claves:
+    """
+    Vista secuencial de las claves ordenadas del léxico para usar `bisect` sobre el mmap.
+    """
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+
+    def __len__(self):
+        return self.lexicon.n_claves
+
+    def __getitem__(self, i):
+        return self.lexicon._clave(i)
+
+
+class Lexicon:
+    """
+    Léxico alias → QIDs en un único fichero binario mapeado en memoria.
+
+    - Las claves son labels y aliases normalizados (ver `normalizar_mencion`),
+      ordenados por bytes en un bloque de strings contiguo.
+    - Cada clave apunta a su lista de QIDs (posting list) ordenada por sitelinks.
+    - El fichero se abre con `mmap`, así que todos los procesos que lo usan
+      comparten las mismas páginas del page cache.
+
+    Sirve como fuente de candidatos alternativa a `wbsearchentities`
+    (ver `buscar`); la hidratación de las entidades sigue a cargo del retriever.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.n_claves, self.n_postings, off_claves, off_postings,
+         off_qids, off_sitelinks, self._off_blob) = CABECERA.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un léxico de tfg_entitylinker")
+
+        vista = memoryview(self._mm)
+        self._offsets_claves = vista[off_claves:off_claves + 8 * (self.n_claves + 1)].cast("Q")
+        self._offsets_postings = vista[off_postings:off_postings + 8 * (self.n_claves + 1)].cast("Q")
+        self._qids = vista[off_qids:off_qids + 4 * self.n_postings].cast("I")
+        self._sitelinks = vista[off_sitelinks:off_sitelinks + 4 * self.n_postings].cast("I")
+        self._claves = _Claves(self)
+
+    def _clave(self, i):
+        inicio = self._off_blob + self._offsets_claves[i]
+        fin = self._off_blob + self._offsets_claves[i + 1]
+        return self._mm[inicio:fin]
+
+    def _postings(self, i):
+        inicio, fin = self._offsets_postings[i], self._offsets_postings[i + 1]
+        return [(self._sitelinks[j], self._qids[j]) for j in range(inicio, fin)]
+
+    def clave(self, i):
+        """
+        Devuelve la clave normalizada con índice `i`.
+        """
+        return self._clave(i).decode("utf-8")
+
+    def indice(self, clave):
+        """
+        Índice de una clave normalizada, o None si no está en el léxico.
+        """
+        objetivo = clave.encode("utf-8")
+        i = bisect_left(self._claves, objetivo)
+        if i < self.n_claves and self._clave(i) == objetivo:
+            return i
+        return None
+
+    def buscar_exacto(self, mencion):
+        """
+        Devuelve [(qid, sitelinks)] de la mención normalizada, ordenados por sitelinks.
+        """
+        i = self.indice(normalizar_mencion(mencion))
+        if i is None:
+            return []
+        return [(f"Q{qid}", sitelinks) for sitelinks, qid in self._postings(i)]
+
+    def buscar_prefijo(self, mencion, max_claves=MAX_CLAVES_PREFIJO):
+        """
+        Devuelve [(qid, sitelinks)] de todas las claves que empiezan por la mención
+        normalizada (como mucho `max_claves` claves), ordenados por sitelinks.
+        Las menciones de menos de `LONGITUD_MINIMA_PREFIJO` caracteres ("PP", "UE")
+        no se expanden, igual que en `WikidataDumpStore.buscar`.
+        """
+        normalizada = normalizar_mencion(mencion)
+        if len(normalizada) < LONGITUD_MINIMA_PREFIJO:
+            return []
+        prefijo = normalizada.encode("utf-8")
+
+        i = bisect_left(self._claves, prefijo)
+        fin = min(self.n_claves, i + max_claves)
+        listas = []
+        while i < fin and self._clave(i).startswith(prefijo):
+            listas.append(self._postings(i))
+            i += 1
+
+        vistos = set()
+        resultados = []
+        for sitelinks, qid in heapq.merge(*listas, key=lambda p: -p[0]):
+            if qid not in vistos:
+                vistos.add(qid)
+                resultados.append((f"Q{qid}", sitelinks))
+        return resultados
+
+    def buscar(self, mencion, language, offset, limit):
+        """
+        Interfaz de búsqueda de CandidateRetriever: primero los matches exactos y
+        después los de prefijo (solo para menciones de al menos
+        `LONGITUD_MINIMA_PREFIJO` caracteres), cada grupo ordenado por sitelinks.
+
+        Returns:
+            tuple: (items, completo). Los items no llevan label de búsqueda, así que
+            `label_original` se resuelve con los labels de la entidad.
+        """
+        qids = [qid for qid, _ in self.buscar_exacto(mencion)]
+        exactos = set(qids)
+        qids.extend(qid for qid, _ in self.buscar_prefijo(mencion) if qid not in exactos)
+
+        pagina = qids[offset:offset + limit]
+        return [{"id": qid, "label": ""} for qid in pagina], offset + limit >= len(qids)
+
+    def close(self):
+        for vista in (self._offsets_claves, self._offsets_postings, self._qids, self._sitelinks):
+            vista.release()
+        self._mm.close()
+
+
+def construir_lexicon(store_path, lexicon_path):
+    """
+    Construye el léxico a partir de la tabla `nombres` de un almacén generado con
+    `dump_store.ingerir_dump`. Las secciones se escriben en ficheros temporales
+    mientras se recorren las filas ya ordenadas, por lo que la memoria no depende
+    del tamaño del léxico.
+
+    Returns:
+        tuple: (n_claves, n_postings)
+    """
+    conn = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+    filas = conn.execute("SELECT nombre, qid, sitelinks FROM nombres ORDER BY nombre, sitelinks DESC, qid")
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(lexicon_path))) as tmp:
+        secciones = {nombre: open(os.path.join(tmp, nombre), "w+b")
+                     for nombre in ("offsets_claves", "offsets_postings", "qids", "sitelinks", "blob")}
+
+        n_claves = n_postings = tam_blob = 0
+        clave_actual = None
+        qids_clave = set()
+        buffers = {"offsets_claves": array("Q"), "offsets_postings": array("Q"),
+                   "qids": array("I"), "sitelinks": array("I")}
+
+        def vaciar_buffers(forzar=False):
+            for nombre, buf in buffers.items():
+                if forzar or len(buf) >= 65536:
+                    buf.tofile(secciones[nombre])
+                    del buf[:]
+
+        for nombre, qid, sitelinks in filas:
+            clave = nombre.encode("utf-8")
+            if clave != clave_actual:
+                buffers["offsets_claves"].append(tam_blob)
+                buffers["offsets_postings"].append(n_postings)
+                secciones["blob"].write(clave)
+                tam_blob += len(clave)
+                n_claves += 1
+                clave_actual = clave
+                qids_clave = set()
+            if qid in qids_clave:
+                continue
+            qids_clave.add(qid)
+            buffers["qids"].append(int(qid[1:]))
+            buffers["sitelinks"].append(sitelinks)
+            n_postings += 1
+            vaciar_buffers()
+
+        buffers["offsets_claves"].append(tam_blob)
+        buffers["offsets_postings"].append(n_postings)
+        vaciar_buffers(forzar=True)
+        conn.close()
+
+        def alinear(pos):
+            return (pos + 7) // 8 * 8
+
+        off_claves = alinear(CABECERA.size)
+        off_postings = alinear(off_claves + 8 * (n_claves + 1))
+        off_qids = alinear(off_postings + 8 * (n_claves + 1))
+        off_sitelinks = alinear(off_qids + 4 * n_postings)
+        off_blob = alinear(off_sitelinks + 4 * n_postings)
+
+        tmp_salida = lexicon_path + ".tmp"
+        with open(tmp_salida, "wb") as out:
+            out.write(CABECERA.pack(MAGIC, n_claves, n_postings, off_claves, off_postings,
+                                    off_qids, off_sitelinks, off_blob))
+            for nombre, offset in (("offsets_claves", off_claves), ("offsets_postings", off_postings),
+                                   ("qids", off_qids), ("sitelinks", off_sitelinks), ("blob", off_blob)):
+                out.write(b"\0" * (offset - out.tell()))
+                seccion = secciones[nombre]
+                seccion.seek(0)
+                shutil.copyfileobj(seccion, out)
+                seccion.close()
+        os.replace(tmp_salida, lexicon_path)
+
+    return n_claves, n_postings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el léxico alias → QID mapeable en memoria.")
+    parser.add_argument("store", help="Almacén SQLite generado con tfg_entitylinker.dump_store")
+    parser.add_argument("lexicon", help="Fichero binario de salida")
+    args = parser.parse_args()
+
+    n_claves, n_postings = construir_lexicon(args.store, args.lexicon)
+    print(f"✅ Léxico con {n_claves} claves y {n_postings} QIDs guardado en {args.lexicon}")
+
+
+if __name__ == "__main__":
+    main()
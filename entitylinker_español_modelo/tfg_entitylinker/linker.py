@@ -1,334 +1,618 @@
 from .ner import NERDetector
 from .candidate_retrieval import CandidateRetriever
+from .async_retrieval import AsyncCandidateRetriever
+from .cache import MemoryCache, SQLiteCache
+from .transport import HTTPTransport
+from .cassette import CassetteTransport
+from .rate_limit import RateLimiter
+from .dump_store import WikidataDumpStore
+from .lexicon import Lexicon
+from .fuzzy import FuzzyIndex
+from .dense_index import DenseIndex
 from .config import ConfigEL
 from .type_filter import filtrar_por_tipo
-from .semantic_similarity import SentenceEncoder, calcular_similitud_contexto_descripcion
-from .score_utils import score_tipo, score_match_exacto, calcular_score_total, score_calidad
-from .context_utils import get_local_context, extraer_contexto_oracion
+from .semantic_similarity import SentenceEncoder, calcular_similitudes
+from .score_utils import score_tipo, score_match_exacto, scores_calidad, calcular_scores_totales, indice_mejor
 from .text_utils import build_entity_text
-import time
+import asyncio
+import os
+
+import numpy as np
 
 
 class EntityLinker:
-    def __init__(self, config=None):
+    def __init__(self, config=None, encoder=None):
+        """
+        Args:
+            config (ConfigEL): Configuración del linker.
+            encoder (SentenceEncoder): Encoder ya cargado para compartirlo entre varios
+                linkers (p. ej. en un barrido de configuraciones); por defecto se crea uno.
+        """
         if config is None:
             config = ConfigEL()
         self.config = config
         self.ner = NERDetector(config.ner_model)
-        self.encoder = SentenceEncoder()
-        self.retriever = CandidateRetriever(
-            language=config.language,
-            top_n=config.top_n_candidatos
+        self.encoder = encoder or SentenceEncoder(
+            cache_dir=config.embedding_cache_dir,
+            cache_capacidad=config.embedding_cache_capacidad
         )
+        self.retriever = self._crear_retriever(config)
+        self.indice_denso = None
+        if config.dense_index_path:
+            self.indice_denso = DenseIndex(config.dense_index_path)
+            if self.indice_denso.model_name != self.encoder.model_name:
+                raise ValueError(
+                    f"El índice denso se construyó con {self.indice_denso.model_name}, "
+                    f"pero el encoder usa {self.encoder.model_name}"
+                )
+        self.retriever_async = AsyncCandidateRetriever(self.retriever, max_concurrencia=config.max_concurrencia)
         self.entidades_previas = []
         self.debug_candidatos = []
+        # QIDs de la última mención enlazada, ordenados por score_total (para recall@k y MRR)
+        self.ultimo_ranking = []
+        self._ultimo_analisis = None
+        self._embeddings_lote = None
+
+    def close(self):
+        """
+        Libera los recursos del linker: el pool de hilos de las búsquedas
+        concurrentes, las conexiones HTTP (y la grabación de la cassette) y los
+        ficheros mapeados en memoria. El encoder no se toca, porque puede estar
+        compartido con otros linkers.
+        """
+        self.retriever_async.close()
+        for recurso in (self.retriever.transport, self.retriever.fuzzy, self.retriever.lexicon):
+            if recurso is not None and hasattr(recurso, "close"):
+                recurso.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _crear_retriever(self, config):
+        """
+        Construye el CandidateRetriever con las cachés, el transporte y las
+        fuentes de candidatos indicadas en la configuración.
+        """
+        cache = None
+        cache_busquedas = MemoryCache(ttl=config.cache_busquedas_ttl, max_entradas=10000)
+        if config.cache_path:
+            cache = SQLiteCache(
+                config.cache_path,
+                ttl=config.cache_ttl,
+                max_entradas=config.cache_max_entradas,
+                tabla="entidades"
+            )
+            cache_busquedas = SQLiteCache(
+                config.cache_path,
+                ttl=config.cache_busquedas_ttl,
+                max_entradas=config.cache_max_entradas,
+                tabla="busquedas"
+            )
+        lexicon = Lexicon(config.lexicon_path) if config.lexicon_path else None
+        fuzzy = None
+        if config.fuzzy_index_path:
+            fuzzy_lexicon = config.fuzzy_lexicon_path or config.lexicon_path
+            if not fuzzy_lexicon:
+                raise ValueError("fuzzy_index_path requiere fuzzy_lexicon_path (o lexicon_path)")
+            if lexicon is not None and os.path.abspath(fuzzy_lexicon) == os.path.abspath(config.lexicon_path):
+                fuzzy_lexicon = lexicon  # mismo fichero: se comparte el mapeo
+            fuzzy = FuzzyIndex(config.fuzzy_index_path, fuzzy_lexicon)
+        transport = HTTPTransport(
+            pool_size=config.http_pool_size,
+            read_timeout=config.http_timeout,
+            user_agent=config.user_agent
+        )
+        rate_limiter = RateLimiter(config.peticiones_por_segundo)
+        if config.cassette_path:
+            transport = CassetteTransport(
+                config.cassette_path,
+                modo=config.cassette_modo,
+                transport=transport if config.cassette_modo == "record" else None,
+                latencia=config.cassette_latencia,
+                estricto=config.cassette_estricto
+            )
+            if config.cassette_modo == "replay":
+                rate_limiter = RateLimiter(None)  # sin red, no hace falta limitar el ritmo
+
+        return CandidateRetriever(
+            language=config.language,
+            top_n=config.top_n_candidatos,
+            cache=cache,
+            cache_busquedas=cache_busquedas,
+            ttl_busquedas_vacias=config.cache_busquedas_vacias_ttl,
+            transport=transport,
+            rate_limiter=rate_limiter,
+            maxlag=config.maxlag,
+            backend=WikidataDumpStore(config.dump_store_path) if config.dump_store_path else None,
+            lexicon=lexicon,
+            fuzzy=fuzzy
+        )
 
     def link(self, texto):
         """
-        Pipeline principal del EL
+        Pipeline principal del EL.
+        Versión síncrona de `alink`: las búsquedas de todas las menciones se lanzan
+        en paralelo y después se puntúan en orden.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.alink(texto))
+
+        # Ya hay un bucle de eventos en este hilo (p. ej. Jupyter): versión secuencial
+        return self._enlazar_menciones(self.ner.analizar(texto))
+
+    async def alink(self, texto):
+        """
+        Pipeline principal del EL en asyncio.
+        Busca e hidrata los candidatos de todas las menciones del documento de forma
+        concurrente (limitada por `max_concurrencia`) y después puntúa cada mención
+        en orden, sin bloquear el bucle de eventos.
+        """
+        loop = asyncio.get_running_loop()
+
+        #Buscar entidades con NER (único análisis del documento)
+        analisis = await loop.run_in_executor(None, self.ner.analizar, texto)
+
+        #Precarga concurrente de la primera página de candidatos de cada mención
+        await self.retriever_async.precargar([mencion for mencion, _, _, _ in analisis.entidades])
+
+        return await loop.run_in_executor(None, self._enlazar_menciones, analisis)
+
+    def link_batch(self, textos, batch_size=64, n_process=1):
+        """
+        Enlaza varios documentos a la vez.
+
+        Por cada lote de `batch_size` textos:
+        1) el NER se ejecuta con `nlp.pipe` (en `n_process` procesos si se indica),
+        2) las búsquedas e hidrataciones se hacen una sola vez por mención distinta del lote,
+        3) los contextos de todas las menciones y los textos de la primera página de
+           candidatos se codifican en llamadas grandes al encoder,
+        4) cada documento se desambigua con su propio estado de coreferencia.
+
+        Returns:
+            list: Una lista de enlaces por documento, en el orden de entrada.
+        """
+        textos = list(textos)
+        resultados = []
+        for inicio in range(0, len(textos), batch_size):
+            lote = self.ner.analizar_lote(textos[inicio:inicio + batch_size], batch_size=batch_size, n_process=n_process)
+            resultados.extend(self._enlazar_lote(lote))
+        return resultados
+
+    def _enlazar_lote(self, analisis_lote):
+        menciones = [(mencion, label) for analisis in analisis_lote for mencion, _, _, label in analisis.entidades]
+
+        #Precarga de la primera página de candidatos de todas las menciones distintas del lote
+        self._precargar([mencion for mencion, _ in menciones])
+
+        #Contextos de todo el lote en una sola llamada al encoder
+        contextos = [
+            self._extraer_contexto(analisis, start)
+            for analisis in analisis_lote for _, start, _, _ in analisis.entidades
+        ]
+        contextos_emb = self.encoder.encode(contextos) if contextos else []
+
+        self._embeddings_lote = {}
+        try:
+            self._precodificar_candidatos(menciones)
+            resultados = []
+            inicio = 0
+            for analisis in analisis_lote:
+                fin = inicio + len(analisis.entidades)
+                self.entidades_previas = []  # coreferencia independiente por documento
+                resultados.append(self._enlazar_menciones(analisis, contextos_emb[inicio:fin]))
+                inicio = fin
+        finally:
+            self._embeddings_lote = None
+        return resultados
+
+    def link_mentions(self, full_text, spans, devolver_ranking=False):
+        """
+        Enlaza de una vez todas las menciones ya delimitadas (p. ej. las gold) de un documento.
+
+        - El texto se analiza una sola vez (contextos y tipo NER de cada span).
+        - Las formas repetidas se buscan una sola vez y los candidatos se hidratan por lotes.
+        - Contextos y textos de candidatos se codifican en llamadas grandes al encoder.
+        - La coreferencia se resuelve en orden de aparición en el documento.
+
+        Args:
+            full_text (str): Texto del documento.
+            spans (list): Tuplas (mention, start, length) o dicts con
+                "mention", "position" (o "start") y "length".
+
+            devolver_ranking (bool): Devolver también, por span, los QIDs candidatos
+                ordenados por score (ver `ultimo_ranking`).
+
+        Returns:
+            list: Para cada span, en el orden recibido, el mismo dict que
+            `link_mention_with_context` o None si no se enlaza.
+            Con `devolver_ranking`, la tupla (resultados, rankings).
+        """
+        spans = [self._normalizar_span(span) for span in spans]
+        if not spans:
+            return ([], []) if devolver_ranking else []
+        analisis = self._analizar(full_text)
+
+        self._precargar([mencion for mencion, _, _ in spans])
+
+        contextos = [self._extraer_contexto(analisis, start) for _, start, _ in spans]
+        unicos = list(dict.fromkeys(contextos))
+        emb_por_contexto = dict(zip(unicos, self.encoder.encode(unicos)))
+        tipos = [analisis.tipo_mencion(mencion, start) for mencion, start, _ in spans]
+
+        resultados = [None] * len(spans)
+        rankings = [[] for _ in spans]
+        self._embeddings_lote = {}
+        try:
+            self._precodificar_candidatos([(mencion, tipo) for (mencion, _, _), tipo in zip(spans, tipos)])
+            for i in sorted(range(len(spans)), key=lambda i: spans[i][1]):
+                mencion, start, length = spans[i]
+                resultados[i] = self._enlazar_mencion(mencion, tipos[i], emb_por_contexto[contextos[i]], start, length)
+                rankings[i] = self.ultimo_ranking
+        finally:
+            self._embeddings_lote = None
+        return (resultados, rankings) if devolver_ranking else resultados
+
+    @staticmethod
+    def _normalizar_span(span):
+        if isinstance(span, dict):
+            start = span["position"] if "position" in span else span["start"]
+            return span["mention"], int(start), int(span["length"])
+        mencion, start, length = span
+        return mencion, int(start), int(length)
+
+    def _precargar(self, menciones):
+        """
+        Precarga concurrente de la primera página de candidatos de las menciones distintas.
+        Si ya hay un bucle de eventos en el hilo se omite y la búsqueda se hace bajo demanda.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.retriever_async.precargar(menciones))
+
+    def _precodificar_candidatos(self, menciones):
+        """
+        Codifica de una vez los textos de la primera página de candidatos de todas
+        las menciones (ya en caché tras la precarga); `_similitudes` los reutiliza.
+        """
+        textos = []
+        for mencion, tipo_ner in dict.fromkeys(menciones):
+            candidatos, _ = self.retriever.buscar_candidatos_pagina(mencion, offset=0, limit=self.config.top_n_candidatos)
+            enriquecidos = self._enriquecer_candidatos(candidatos)
+            if self.config.filtrar_por_tipo:
+                enriquecidos = filtrar_por_tipo(enriquecidos, tipo_ner)
+            textos.extend(self._texto_entidad(c, mencion.lower()) for c in enriquecidos)
+        self._similitudes(None, list(dict.fromkeys(textos)))
+
+    def _enlazar_menciones(self, analisis, contextos_emb=None):
+        """
+        Desambigua en orden las menciones detectadas por el NER.
+        Los contextos de todas las menciones se codifican en una sola llamada al encoder.
         """
-        #Buscar entidades con NER
-        menciones = self.ner.detectar_menciones(texto)
         enlaces = []
         self.debug_candidatos = []
 
-        for mencion, start, end, label in menciones:
-            mejores_candidatos = {}
-            encontrados = {}
-            m = mencion.lower()
+        #Sacar contexto
+        if contextos_emb is None:
+            contextos = [self._extraer_contexto(analisis, start) for _, start, _, _ in analisis.entidades]
+            contextos_emb = self.encoder.encode(contextos) if contextos else []
 
-            #Sacar contexto
-            contexto = (
-                get_local_context(texto, start, ventana=self.config.ventana_contexto)
-                if self.config.modo_contexto == "ventana"
-                else extraer_contexto_oracion(texto, start)
+        for (mencion, start, end, label), contexto_emb in zip(analisis.entidades, contextos_emb):
+            enlace = self._enlazar_mencion(
+                mencion, label, contexto_emb, start, end - start,
+                registrar_debug=self.config.mostrar_debug
             )
-
-            #Loop para los retries
-            for intento in range(self.config.max_retries + 1):
-                n = self.config.top_n_candidatos * (intento + 1)
-                if self.config.mostrar_debug:
-                    print(f"🔁 Retry {intento+1}: buscando top {n} candidatos para '{mencion}'")
-
-                #Recupera los candidatos
-                candidatos = self.retriever.buscar_candidatos(mencion, limit=n)
-
-                enriquecidos = []
-                for c in candidatos:
-                    detalles = self.retriever.obtener_detalles_entidad(c["id"])
-                    c["p31"] = detalles.get("p31", [])
-                    c["aliases"] = detalles.get("aliases", [])
-                    c["description"] = detalles.get("description", "")
-                    c["sitelinks"] = detalles.get("sitelinks", 0)
-                    c["label_es"] = detalles.get("label_es", "")
-                    c["label_original"] = detalles.get("label_original", "")
-                    c["label"] = c["label_es"] or c["label_original"]
-                    enriquecidos.append(c)
-
-                #Elimina los de otros tipos
-                if self.config.filtrar_por_tipo:
-                    enriquecidos = filtrar_por_tipo(enriquecidos, label)
-
-                for c in enriquecidos:
-                    encontrados[c["id"]] = c
-
-                #Saca la popularidad
-                max_sitelinks = max((e["sitelinks"] for e in encontrados.values()), default=1)
-
-                for c in enriquecidos:
-                    matched_alias = next((a for a in c.get("aliases", []) if a.lower() == m), None)
-                    texto_entidad = build_entity_text(
-                        label=c.get("label", ""),
-                        matched_alias=matched_alias,
-                        description=c.get("description", "")
-                    )
-                    #Saca la similitud contextual
-                    similitud = calcular_similitud_contexto_descripcion(contexto, texto_entidad, self.encoder)
-                    #Saca la puntuación por tipo
-                    tipo_score = score_tipo(label, c["p31"], self.config.eliminar_tipos_opuestos)
-                    if tipo_score is None:
-                        continue
-                    #Saca la puntuación de match
-                    match_score = score_match_exacto(mencion, c.get("label_es", ""), c.get("label_original", ""), c.get("aliases", []))
-                    #Saca la puntuación de popularidad
-                    calidad_score = score_calidad(c, max_sitelinks)
-                    #Calcula el score total
-                    total = calcular_score_total(similitud, tipo_score, match_score, calidad_score, pesos=self.config.pesos_score)
-                    c["score_total"] = total
-                    mejores_candidatos[c["id"]] = c
-
-                    if self.config.mostrar_debug:
-                        self.debug_candidatos.append({
-                            "mencion": mencion,
-                            "label": c.get("label", ""),
-                            "id": c.get("id", ""),
-                            "descripcion": c.get("description", ""),
-                            "similitud": similitud,
-                            "tipo_score": tipo_score,
-                            "match_score": match_score,
-                            "calidad_score": calidad_score,
-                            "bonus": 0.0,
-                            "score_total": total,
-                            "origen": "candidato"
-                        })
-
-                # Early exit si algún candidato supera el threshold
-                if any(c["score_total"] >= self.config.score_threshold for c in mejores_candidatos.values()):
-                    break
-
-            # Evaluar entidades previas solo una vez
-            if self.config.reusar_entidades_anteriores:
-                for prev in self.entidades_previas:
-                    alias_match = any(m == a.lower() for a in prev["aliases"])
-                    label_match = any(m in prev.get(k, "").lower().split() for k in ["label", "label_es", "label_original"])
-                    if label_match or alias_match:
-                        texto_entidad = build_entity_text(
-                            label=prev.get("label", ""),
-                            matched_alias=m if m in prev.get("aliases", []) else None,
-                            description=prev.get("description", "")
-                        )
-                        similitud = calcular_similitud_contexto_descripcion(contexto, texto_entidad, self.encoder)
-                        tipo_score = score_tipo(label, prev.get("p31", []), self.config.eliminar_tipos_opuestos)
-                        if tipo_score is None:
-                            continue
-                        match_score = score_match_exacto(mencion, prev.get("label_es", ""), prev.get("label_original", ""), prev.get("aliases", []))
-                        calidad_score = score_calidad(prev, max_sitelinks)
-                        base_score = calcular_score_total(similitud, tipo_score, match_score, calidad_score, self.config.pesos_score)
-                        bonus = self.config.bonus_coref_match if match_score == 1.0 else self.config.bonus_coref_nomatch
-                        total = base_score + bonus
-                        candidato_prev = prev.copy()
-                        candidato_prev["score_total"] = total
-                        mejores_candidatos[candidato_prev["id"]] = candidato_prev
-
-                        if self.config.mostrar_debug:
-                            self.debug_candidatos.append({
-                                "mencion": mencion,
-                                "label": prev.get("label", ""),
-                                "id": prev.get("id", ""),
-                                "descripcion": prev.get("description", ""),
-                                "similitud": similitud,
-                                "tipo_score": tipo_score,
-                                "match_score": match_score,
-                                "calidad_score": calidad_score,
-                                "bonus": bonus,
-                                "score_total": total,
-                                "origen": "coreferencia"
-                            })
-
-            if mejores_candidatos:
-                mejor = max(mejores_candidatos.values(), key=lambda x: x["score_total"])
-                if mejor["score_total"] >= self.config.umbral_absoluto:
-                    enlaces.append({
-                        "mencion": mencion,
-                        "qid": mejor.get("id", ""),
-                        "label": mejor.get("label", ""),
-                        "descripcion": mejor.get("description", ""),
-                        "tipo_ner": label,
-                        "score": round(mejor["score_total"], 3),
-                        "position": start,                     
-                        "length": end - start 
-                    })
-                    self.entidades_previas.append({
-                        "id": mejor.get("id", ""),
-                        "label": mejor.get("label", ""),
-                        "label_es": mejor.get("label_es", ""),
-                        "label_original": mejor.get("label_original", ""),
-                        "aliases": mejor.get("aliases", []),
-                        "p31": mejor.get("p31", []),
-                        "description": mejor.get("description", ""),
-                        "sitelinks": mejor.get("sitelinks", 0)
-                    })
+            if enlace:
+                enlaces.append(enlace)
 
         return enlaces
 
-    def obtener_tipo_mencion(self, mention: str, full_text: str, position: int, length: int) -> str:
+    def _extraer_contexto(self, analisis, start):
+        return (
+            analisis.contexto_ventana(start, ventana=self.config.ventana_contexto)
+            if self.config.modo_contexto == "ventana"
+            else analisis.contexto_oracion(start)
+        )
+
+    def _analizar(self, texto):
         """
-        Usa spaCy para extraer la frase donde está la mención (usando el offset),
-        y ejecuta NER solo sobre esa oración.
-        Devuelve el tipo NER (PER, LOC, ORG...) o None si no se detecta.
+        Análisis spaCy del texto, reutilizando el último si es el mismo documento
+        (el Evaluator enlaza varias menciones seguidas de cada documento).
         """
-        doc = self.ner.nlp(full_text)
+        if self._ultimo_analisis is None or self._ultimo_analisis.texto != texto:
+            self._ultimo_analisis = self.ner.analizar(texto)
+        return self._ultimo_analisis
 
-        # Encontrar la oración que contiene la posición de la mención
-        for sent in doc.sents:
-            if sent.start_char <= position < sent.end_char:
-                oracion = sent.text
-                break
-        else:
-            return None  # No se encontró ninguna frase conteniendo la mención
+    def _enlazar_mencion(self, mencion, tipo_ner, contexto_emb, start, length, registrar_debug=False):
+        """
+        Recupera y puntúa los candidatos de una mención, añade las entidades previas
+        (coreferencia) y devuelve el mejor enlace o None si no supera `umbral_absoluto`.
+        El enlace aceptado se guarda en `entidades_previas`.
+        """
+        #Recupera y puntúa los candidatos con reintentos incrementales
+        mejores_candidatos, max_sitelinks = self._recuperar_y_puntuar(
+            mencion, tipo_ner, contexto_emb, registrar_debug=registrar_debug
+        )
 
-        entidades = self.ner.detectar_menciones(oracion)  # [(text, start, end, tipo)]
-        mention_lower = mention.lower()
+        # Evaluar entidades previas solo una vez
+        if self.config.reusar_entidades_anteriores:
+            self._puntuar_coreferencias(
+                mencion, tipo_ner, contexto_emb, max_sitelinks, mejores_candidatos, registrar_debug=registrar_debug
+            )
 
-        for texto, _, _, tipo in entidades:
-            if texto.lower() == mention_lower:
-                return tipo
+        candidatos = list(mejores_candidatos.values())
+        self.ultimo_ranking = [c["id"] for c in sorted(candidatos, key=lambda c: -c["score_total"])]
+        if not candidatos:
+            return None
 
-        return None
+        mejor = candidatos[indice_mejor([c["score_total"] for c in candidatos])]
+        if mejor["score_total"] < self.config.umbral_absoluto:
+            return None
 
-    
-    def link_mention_with_context(self, mention: str, full_text: str, start: int, length: int) -> dict:
+        # Guardar para coreferencia futura
+        self.entidades_previas.append({
+            "id": mejor.get("id", ""),
+            "label": mejor.get("label", ""),
+            "label_es": mejor.get("label_es", ""),
+            "label_original": mejor.get("label_original", ""),
+            "aliases": mejor.get("aliases", []),
+            "p31": mejor.get("p31", []),
+            "description": mejor.get("description", ""),
+            "sitelinks": mejor.get("sitelinks", 0)
+        })
+
+        return {
+            "mencion": mencion,
+            "qid": mejor.get("id", ""),
+            "label": mejor.get("label", ""),
+            "descripcion": mejor.get("description", ""),
+            "tipo_ner": tipo_ner,
+            "score": round(mejor["score_total"], 3),
+            "position": start,
+            "length": length
+        }
+
+    def _similitudes(self, contexto_emb, textos):
         """
-        Enlaza una mención concreta dentro de un documento, detectando su tipo NER,
-        utilizando contexto local, candidatos de Wikidata y coreferencia.
-        Todo el resto es igual que el pipeline anterior
+        Similitud del contexto con todos los textos de entidad, codificados en una sola llamada.
+        Dentro de `link_batch` los embeddings ya calculados en el lote se reutilizan
+        (con contexto_emb=None solo se codifican y se guardan).
+        """
+        if not textos:
+            return []
+        if self._embeddings_lote is None:
+            return calcular_similitudes(contexto_emb, self.encoder.encode_entidades(textos))
+
+        pendientes = [t for t in dict.fromkeys(textos) if t not in self._embeddings_lote]
+        if pendientes:
+            self._embeddings_lote.update(zip(pendientes, self.encoder.encode_entidades(pendientes)))
+        if contexto_emb is None:
+            return []
+        return calcular_similitudes(contexto_emb, np.stack([self._embeddings_lote[t] for t in textos]))
+
+    @staticmethod
+    def _texto_entidad(c, m):
+        """
+        Texto de la entidad para la similitud: label, alias que coincide con la mención `m` (en minúsculas) y descripción.
+        """
+        matched_alias = next((a for a in c.get("aliases", []) if a.lower() == m), None)
+        return build_entity_text(
+            label=c.get("label", ""),
+            matched_alias=matched_alias,
+            description=c.get("description", "")
+        )
+
+    def _recuperar_y_puntuar(self, mencion, tipo_ner, contexto_emb, registrar_debug=False):
         """
+        Bucle de reintentos: cada intento pide solo la siguiente página de
+        `top_n_candidatos` resultados y puntúa únicamente los candidatos nuevos;
+        los scores de intentos anteriores se conservan.
+        Se detiene al superar `score_threshold` o cuando la búsqueda no tiene más resultados.
 
+        Returns:
+            tuple: (mejores_candidatos, max_sitelinks)
+        """
         mejores_candidatos = {}
         encontrados = {}
-        m = mention.lower()
-        end = start + length
+        m = mencion.lower()
+        max_sitelinks = 1
+        offset = 0
 
-        # Obtener contexto local (frase o ventana)
-        contexto = (
-            get_local_context(full_text, start, ventana=self.config.ventana_contexto)
-            if self.config.modo_contexto == "ventana"
-            else extraer_contexto_oracion(full_text, start)
-        )
+        for intento in range(self.config.max_retries + 1):
+            n = self.config.top_n_candidatos
+            if self.config.mostrar_debug:
+                print(f"🔁 Retry {intento+1}: buscando candidatos {offset+1}-{offset+n} para '{mencion}'")
 
-        # Obtener tipo NER para la mención (ej: PER, ORG, etc.)
-        tipo_ner = self.obtener_tipo_mencion(mention, full_text, start, length)
+            #Recupera solo la cola de candidatos nueva
+            candidatos, siguiente_offset = self.retriever.buscar_candidatos_pagina(mencion, offset=offset, limit=n)
+            if intento == 0 and self.indice_denso is not None:
+                candidatos = self._fusionar_candidatos_densos(candidatos, contexto_emb)
+            candidatos = [c for c in candidatos if c["id"] not in encontrados]
 
-        # Buscar candidatos iterativamente
-        for intento in range(self.config.max_retries + 1):
-            n = self.config.top_n_candidatos * (intento + 1)
-            candidatos = self.retriever.buscar_candidatos(mention, limit=n)
-            time.sleep(0.2)
-
-            enriquecidos = []
-            for c in candidatos:
-                detalles = self.retriever.obtener_detalles_entidad(c["id"])
-                c["p31"] = detalles.get("p31", [])
-                c["aliases"] = detalles.get("aliases", [])
-                c["description"] = detalles.get("description", "")
-                c["sitelinks"] = detalles.get("sitelinks", 0)
-                c["label_es"] = detalles.get("label_es", "")
-                c["label_original"] = detalles.get("label_original", "")
-                c["label"] = c["label_es"] or c["label_original"]
-                enriquecidos.append(c)
+            enriquecidos = self._enriquecer_candidatos(candidatos)
 
+            #Elimina los de otros tipos
             if self.config.filtrar_por_tipo:
                 enriquecidos = filtrar_por_tipo(enriquecidos, tipo_ner)
 
             for c in enriquecidos:
                 encontrados[c["id"]] = c
 
+            #Saca la popularidad
             max_sitelinks = max((e["sitelinks"] for e in encontrados.values()), default=1)
 
+            #Saca la puntuación por tipo
+            puntuables = []
             for c in enriquecidos:
-                matched_alias = next((a for a in c.get("aliases", []) if a.lower() == m), None)
-                texto_entidad = build_entity_text(
-                    label=c.get("label", ""),
-                    matched_alias=matched_alias,
-                    description=c.get("description", "")
-                )
-                similitud = calcular_similitud_contexto_descripcion(contexto, texto_entidad, self.encoder)
                 tipo_score = score_tipo(tipo_ner, c["p31"], self.config.eliminar_tipos_opuestos)
-                if tipo_score is None:
-                    continue
-                match_score = score_match_exacto(mention, c.get("label_es", ""), c.get("label_original", ""), c.get("aliases", []))
-                calidad_score = score_calidad(c, max_sitelinks)
-                total = calcular_score_total(similitud, tipo_score, match_score, calidad_score, pesos=self.config.pesos_score)
+                if tipo_score is not None:
+                    puntuables.append((c, tipo_score))
+
+            #Saca la similitud contextual de todos los candidatos a la vez
+            textos = [self._texto_entidad(c, m) for c, _ in puntuables]
+            similitudes = self._similitudes(contexto_emb, textos)
+
+            #Saca la puntuación de match
+            matches = [
+                score_match_exacto(mencion, c.get("label_es", ""), c.get("label_original", ""), c.get("aliases", []))
+                for c, _ in puntuables
+            ]
+            #Saca la puntuación de popularidad
+            calidades = scores_calidad([c.get("sitelinks", 0) for c, _ in puntuables], max_sitelinks)
+            #Calcula el score total de todos los candidatos a la vez
+            totales = calcular_scores_totales(
+                similitudes, [t for _, t in puntuables], matches, calidades, pesos=self.config.pesos_score
+            )
+
+            for (c, tipo_score), similitud, match_score, calidad_score, total in zip(
+                    puntuables, similitudes, matches, calidades, totales):
                 c["score_total"] = total
                 mejores_candidatos[c["id"]] = c
 
+                if registrar_debug:
+                    self.debug_candidatos.append({
+                        "mencion": mencion,
+                        "label": c.get("label", ""),
+                        "id": c.get("id", ""),
+                        "descripcion": c.get("description", ""),
+                        "similitud": similitud,
+                        "tipo_score": tipo_score,
+                        "match_score": match_score,
+                        "calidad_score": calidad_score,
+                        "bonus": 0.0,
+                        "score_total": total,
+                        "origen": "candidato"
+                    })
+
+            # Early exit si algún candidato supera el threshold
             if any(c["score_total"] >= self.config.score_threshold for c in mejores_candidatos.values()):
                 break
 
-        # Aplicar coreferencia si está activado
-        if self.config.reusar_entidades_anteriores:
-            for prev in self.entidades_previas:
-                alias_match = any(m == a.lower() for a in prev["aliases"])
-                label_match = any(m in prev.get(k, "").lower().split() for k in ["label", "label_es", "label_original"])
-                if label_match or alias_match:
-                    texto_entidad = build_entity_text(
-                        label=prev.get("label", ""),
-                        matched_alias=m if m in prev.get("aliases", []) else None,
-                        description=prev.get("description", "")
-                    )
-                    similitud = calcular_similitud_contexto_descripcion(contexto, texto_entidad, self.encoder)
-                    tipo_score = score_tipo(tipo_ner, prev.get("p31", []), self.config.eliminar_tipos_opuestos)
-                    if tipo_score is None:
-                        continue
-                    match_score = score_match_exacto(mention, prev.get("label_es", ""), prev.get("label_original", ""), prev.get("aliases", []))
-                    calidad_score = score_calidad(prev, max_sitelinks)
-                    base_score = calcular_score_total(similitud, tipo_score, match_score, calidad_score, self.config.pesos_score)
-                    bonus = self.config.bonus_coref_match if match_score == 1.0 else self.config.bonus_coref_nomatch
-                    total = base_score + bonus
-                    candidato_prev = prev.copy()
-                    candidato_prev["score_total"] = total
-                    candidato_prev["coreferencia"] = True
-                    mejores_candidatos[candidato_prev["id"]] = candidato_prev
-
-        if not mejores_candidatos:
-            return None
+            # Early exit si la búsqueda ya no tiene más resultados
+            if siguiente_offset is None:
+                break
+            offset = siguiente_offset
 
-        mejor = max(mejores_candidatos.values(), key=lambda x: x["score_total"])
+        return mejores_candidatos, max_sitelinks
 
-        if mejor["score_total"] < self.config.umbral_absoluto:
-            return None
+    def _fusionar_candidatos_densos(self, candidatos, contexto_emb):
+        """
+        Añade a los candidatos léxicos los vecinos más cercanos del contexto en el
+        índice denso (sin peticiones de búsqueda extra; se hidratan en el mismo lote).
+        """
+        vistos = {c["id"] for c in candidatos}
+        for qid, _ in self.indice_denso.buscar(contexto_emb, k=self.config.dense_top_k):
+            if qid not in vistos:
+                vistos.add(qid)
+                candidatos.append({"id": qid, "label": ""})
+        return candidatos
+
+    def _puntuar_coreferencias(self, mencion, tipo_ner, contexto_emb, max_sitelinks, mejores_candidatos,
+                               registrar_debug=False):
+        """
+        Añade a `mejores_candidatos` las entidades ya enlazadas en el documento que
+        encajan con la mención, con el bonus de coreferencia correspondiente.
+        """
+        m = mencion.lower()
+        previas = []
+        for prev in self.entidades_previas:
+            alias_match = any(m == a.lower() for a in prev["aliases"])
+            label_match = any(m in prev.get(k, "").lower().split() for k in ["label", "label_es", "label_original"])
+            if label_match or alias_match:
+                tipo_score = score_tipo(tipo_ner, prev.get("p31", []), self.config.eliminar_tipos_opuestos)
+                if tipo_score is not None:
+                    previas.append((prev, tipo_score))
+
+        textos = [
+            build_entity_text(
+                label=prev.get("label", ""),
+                matched_alias=m if m in prev.get("aliases", []) else None,
+                description=prev.get("description", "")
+            )
+            for prev, _ in previas
+        ]
+        similitudes = self._similitudes(contexto_emb, textos)
+
+        matches = [
+            score_match_exacto(mencion, prev.get("label_es", ""), prev.get("label_original", ""), prev.get("aliases", []))
+            for prev, _ in previas
+        ]
+        calidades = scores_calidad([prev.get("sitelinks", 0) for prev, _ in previas], max_sitelinks)
+        base_scores = calcular_scores_totales(
+            similitudes, [t for _, t in previas], matches, calidades, pesos=self.config.pesos_score
+        )
 
-        resultado = {
-            "mencion": mention,
-            "qid": mejor.get("id", ""),
-            "label": mejor.get("label", ""),
-            "descripcion": mejor.get("description", ""),
-            "tipo_ner": tipo_ner,
-            "score": round(mejor["score_total"], 3),
-            "position": start,
-            "length": length
-        }
+        for (prev, tipo_score), similitud, match_score, calidad_score, base_score in zip(
+                previas, similitudes, matches, calidades, base_scores):
+            bonus = self.config.bonus_coref_match if match_score == 1.0 else self.config.bonus_coref_nomatch
+            total = base_score + bonus
+            candidato_prev = prev.copy()
+            candidato_prev["score_total"] = total
+            candidato_prev["coreferencia"] = True
+            mejores_candidatos[candidato_prev["id"]] = candidato_prev
+
+            if registrar_debug:
+                self.debug_candidatos.append({
+                    "mencion": mencion,
+                    "label": prev.get("label", ""),
+                    "id": prev.get("id", ""),
+                    "descripcion": prev.get("description", ""),
+                    "similitud": similitud,
+                    "tipo_score": tipo_score,
+                    "match_score": match_score,
+                    "calidad_score": calidad_score,
+                    "bonus": bonus,
+                    "score_total": total,
+                    "origen": "coreferencia"
+                })
+
+    def _enriquecer_candidatos(self, candidatos):
+        """
+        Completa los candidatos con los detalles de Wikidata, pidiendo
+        todos los QIDs que falten en caché en una sola ronda por lotes.
+        """
+        detalles_por_qid = self.retriever.obtener_detalles_entidades([c["id"] for c in candidatos])
+
+        enriquecidos = []
+        for c in candidatos:
+            detalles = detalles_por_qid[c["id"]]
+            c["p31"] = detalles.get("p31", [])
+            c["aliases"] = detalles.get("aliases", [])
+            c["description"] = detalles.get("description", "")
+            c["sitelinks"] = detalles.get("sitelinks", 0)
+            c["label_es"] = detalles.get("label_es", "")
+            c["label_original"] = detalles.get("label_original", "")
+            c["label"] = c["label_es"] or c["label_original"]
+            enriquecidos.append(c)
+        return enriquecidos
 
-        # Guardar para coreferencia futura
-        self.entidades_previas.append({
-            "id": mejor.get("id", ""),
-            "label": mejor.get("label", ""),
-            "label_es": mejor.get("label_es", ""),
-            "label_original": mejor.get("label_original", ""),
-            "aliases": mejor.get("aliases", []),
-            "p31": mejor.get("p31", []),
-            "description": mejor.get("description", ""),
-            "sitelinks": mejor.get("sitelinks", 0)
-        })
+    def obtener_tipo_mencion(self, mention: str, full_text: str, position: int, length: int) -> str:
+        """
+        Busca la frase donde está la mención (usando el offset) en el análisis
+        del documento y toma el tipo de la entidad detectada con el mismo texto.
+        Devuelve el tipo NER (PER, LOC, ORG...) o None si no se detecta.
+        """
+        return self._analizar(full_text).tipo_mencion(mention, position)
+
+    
+    def link_mention_with_context(self, mention: str, full_text: str, start: int, length: int) -> dict:
+        """
+        Enlaza una mención concreta dentro de un documento, detectando su tipo NER,
+        utilizando contexto local, candidatos de Wikidata y coreferencia.
+        Todo el resto es igual que el pipeline anterior
+        """
+
+        # Obtener contexto local (frase o ventana)
+        contexto = self._extraer_contexto(self._analizar(full_text), start)
+        contexto_emb = self.encoder.encode([contexto])[0]
+
+        # Obtener tipo NER para la mención (ej: PER, ORG, etc.)
+        tipo_ner = self.obtener_tipo_mencion(mention, full_text, start, length)
 
-        return resultado
+        # Buscar candidatos iterativamente, aplicar coreferencia y elegir el mejor
+        return self._enlazar_mencion(mention, tipo_ner, contexto_emb, start, length)
@@ -1,8 +1,10 @@
-import spacy
+from .document_analysis import DocumentAnalysis
+from .spacy_models import obtener_modelo
 
 class NERDetector:
     def __init__(self, model_name="es_core_news_lg"):
-        self.nlp = spacy.load(model_name)
+        # Instancia compartida con el resto de la librería (ver spacy_models)
+        self.nlp = obtener_modelo(model_name)
     
     def detectar_menciones(self, texto):
         """
@@ -11,3 +13,16 @@ class NERDetector:
         """
         doc = self.nlp(texto)
         return [(ent.text, ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+
+    def analizar(self, texto):
+        """
+        Procesa el texto una sola vez y devuelve su DocumentAnalysis
+        (menciones, oraciones y tokens con offsets).
+        """
+        return DocumentAnalysis(self.nlp(texto))
+
+    def analizar_lote(self, textos, batch_size=64, n_process=1):
+        """
+        Versión por lotes de `analizar` con `nlp.pipe`; conserva el orden de entrada.
+        """
+        return [DocumentAnalysis(doc) for doc in self.nlp.pipe(textos, batch_size=batch_size, n_process=n_process)]
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class RateLimiter:
+    """
+    Limitador token bucket compartido por todos los hilos (y por tanto por las
+    corrutinas de AsyncCandidateRetriever, que se ejecutan en hilos).
+
+    - `peticiones_por_segundo` es el ritmo sostenido; `rafaga` el número de
+      peticiones que pueden salir seguidas tras un periodo de inactividad.
+    - `pausar(segundos)` bloquea a todos los usuarios del limitador, p. ej. tras
+      recibir un `Retry-After` del servidor.
+    - Con `peticiones_por_segundo=None` no limita el ritmo (solo aplica las pausas).
+    """
+    def __init__(self, peticiones_por_segundo=5.0, rafaga=None):
+        self.tasa = peticiones_por_segundo
+        self.capacidad = rafaga if rafaga is not None else max(1.0, peticiones_por_segundo or 1.0)
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def _espera_necesaria(self):
+        """
+        Intenta consumir un token. Devuelve 0 si lo consigue o los segundos que hay que esperar.
+        Debe llamarse con el lock adquirido.
+        """
+        ahora = time.monotonic()
+        if self._pausa_hasta > ahora:
+            return self._pausa_hasta - ahora
+        if self.tasa is None:
+            return 0.0
+
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return 0.0
+        return (1.0 - self._tokens) / self.tasa
+
+    def adquirir(self):
+        """
+        Bloquea hasta que se pueda enviar una petición.
+        """
+        while True:
+            with self._lock:
+                espera = self._espera_necesaria()
+            if espera <= 0:
+                return
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        """
+        Impide enviar peticiones durante `segundos` a todos los usuarios del limitador.
+        """
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+
+
+def parsear_retry_after(valor):
+    """
+    Interpreta la cabecera `Retry-After` (segundos o fecha HTTP).
+    Devuelve los segundos de espera o None si no es válida.
+    """
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, fecha.timestamp() - time.time())
+
+
+def calcular_backoff(intento, base=1.0, maximo=60.0):
+    """
+    Backoff exponencial con jitter: entre la mitad y el total de base * 2^intento, limitado a `maximo`.
+    """
+    techo = min(maximo, base * (2 ** intento))
+    return techo / 2 + random.uniform(0, techo / 2)
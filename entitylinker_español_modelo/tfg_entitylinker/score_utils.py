@@ -1,5 +1,7 @@
 
 # tfg_entitylinker/score_utils.py
+import numpy as np
+
 from tfg_entitylinker.type_filter import TIPOS_OPUESTOS
 
 # Mapeo de tipos NER ↔ tipos P31 válidos
@@ -105,3 +107,37 @@ def calcular_score_total(similitud, tipo_score, match_score, calidad_score=0.0,
         gamma * match_score +
         delta * calidad_score
     )
+
+
+def scores_calidad(sitelinks, max_sitelinks):
+    """
+    Versión vectorizada de score_calidad a partir de los sitelinks de cada candidato.
+    """
+    sitelinks = np.asarray(sitelinks, dtype=np.float64)
+    return sitelinks / max_sitelinks if max_sitelinks > 0 else np.zeros_like(sitelinks)
+
+
+def calcular_scores_totales(similitudes, tipo_scores, match_scores, calidad_scores,
+                            pesos=(0.45, 0.20, 0.15, 0.20)):
+    """
+    Versión vectorizada de calcular_score_total: un score_total por candidato.
+    Cada término se calcula sobre la columna entera y se acumula en el mismo
+    orden y con el mismo tipo (el de las similitudes) que en la versión escalar,
+    así que los resultados son idénticos bit a bit.
+    """
+    alpha, beta, gamma, delta = pesos
+    similitudes = np.asarray(similitudes)
+    if similitudes.dtype.kind != "f":
+        similitudes = similitudes.astype(np.float64)
+
+    totales = alpha * similitudes
+    for peso, columna in ((beta, tipo_scores), (gamma, match_scores), (delta, calidad_scores)):
+        totales = totales + (peso * np.asarray(columna, dtype=np.float64)).astype(totales.dtype)
+    return totales
+
+
+def indice_mejor(scores):
+    """
+    Posición del mayor score (la primera si hay empate, igual que max()).
+    """
+    return int(np.argmax(scores))
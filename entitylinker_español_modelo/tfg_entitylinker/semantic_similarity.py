@@ -1,18 +1,51 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+from .embedding_cache import EmbeddingCache
+
 class SentenceEncoder:
     """
     Clase para codificar oraciones en vectores mediante un modelo de Sentence-Transformers.
     Por defecto, usa un modelo multilingüe preentrenado.
     """
-    def __init__(self, model_name='sentence-transformers/paraphrase-multilingual-mpnet-base-v2'):
+    def __init__(self, model_name='sentence-transformers/paraphrase-multilingual-mpnet-base-v2', cache_dir=None,
+                 cache_capacidad=200000):
+        # Import diferido: sentence_transformers (y torch) solo se cargan al crear el encoder
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        # Llamadas al modelo y textos codificados (para medir el coste en los benchmarks)
+        self.llamadas = 0
+        self.textos_codificados = 0
+        self.cache = None
+        if cache_dir:
+            self.cache = EmbeddingCache(
+                cache_dir, model_name, self.model.get_sentence_embedding_dimension(), capacidad=cache_capacidad
+            )
 
     def encode(self, sentences):
+        self.llamadas += 1
+        self.textos_codificados += len(sentences)
         return self.model.encode(sentences, convert_to_numpy=True)
 
+    def encode_entidades(self, textos):
+        """
+        Codifica textos de entidad (label + descripción) pasando por la caché persistente.
+        Solo los textos que no están en caché llegan al modelo, en una única llamada.
+        Los vectores se devuelven redondeados a float16 tanto si vienen de la caché
+        como si no, para que el score no dependa de si hubo acierto.
+        """
+        if self.cache is None:
+            return self.encode(textos)
+
+        vectores = self.cache.buscar(textos)
+        pendientes = list(dict.fromkeys(t for t in textos if t not in vectores))
+        if pendientes:
+            nuevos = self.encode(pendientes).astype(np.float16)
+            self.cache.guardar(pendientes, nuevos)
+            vectores.update(zip(pendientes, nuevos.astype(np.float32)))
+        return np.stack([vectores[t] for t in textos])
+
 def calcular_similitud_contexto_descripcion(contexto, descripcion, encoder):
     """
     Calcula la similitud entre el contexto y la descripción de una entidad
@@ -20,6 +53,26 @@ def calcular_similitud_contexto_descripcion(contexto, descripcion, encoder):
     Retorna:
     - similitud: valor entre -1 y 1 (normalmente entre 0 y 1)
     """
+    from sklearn.metrics.pairwise import cosine_similarity
+
     embeddings = encoder.encode([contexto, descripcion])
     similitud = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
     return similitud
+
+def normalizar_embeddings(embeddings):
+    """
+    Normaliza a norma 1 cada fila (los vectores nulos se dejan a cero).
+    """
+    embeddings = np.atleast_2d(embeddings)
+    normas = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normas[normas == 0] = 1
+    return embeddings / normas
+
+def calcular_similitudes(contexto_emb, entidades_emb):
+    """
+    Calcula de una vez la similitud del coseno entre el embedding del contexto
+    y los embeddings de varias entidades (una fila por entidad).
+    Retorna:
+    - array con una similitud por entidad
+    """
+    return (normalizar_embeddings(entidades_emb) @ normalizar_embeddings(contexto_emb).T)[:, 0]
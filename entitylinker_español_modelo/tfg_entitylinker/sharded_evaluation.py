@@ -0,0 +1,130 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import zlib
+
+from .config import ConfigEL
+from .evaluator import Evaluator, cargar_resultados, calcular_metricas, imprimir_metricas
+
+
+def shard_de_docid(docid, n_shards):
+    """
+    Shard de un documento: crc32 de su docid, estable entre procesos y máquinas
+    (a diferencia de `hash()`, que cambia con PYTHONHASHSEED).
+    """
+    return zlib.crc32(str(docid).encode("utf-8")) % n_shards
+
+
+def ruta_shard(directorio, shard, n_shards):
+    return os.path.join(directorio, f"shard-{shard:04d}-de-{n_shards:04d}.jsonl")
+
+
+def evaluar_shard(shard, n_shards, directorio, mentions_path, docs_path, config_kwargs=None,
+                  corpus_path=None, solo_local=False, max_docs=None, reanudar=False):
+    """
+    Evalúa un shard con su propio EntityLinker (estado y cachés en memoria aislados)
+    y escribe sus filas por mención en `directorio`. Pensado para lanzarse en un
+    proceso o en un nodo distinto por shard. Con `reanudar`, los documentos ya
+    terminados en el fichero del shard no se vuelven a evaluar.
+
+    Returns:
+        str: Ruta del fichero de resultados del shard.
+    """
+    from .linker import EntityLinker
+
+    linker = EntityLinker(ConfigEL(**(config_kwargs or {})))
+    evaluator = Evaluator(linker, mentions_path, docs_path, corpus_path=corpus_path, solo_local=solo_local)
+    # max_docs se aplica antes de repartir, para que la unión de shards sea la misma evaluación
+    docids = [d for d in evaluator.docids(max_docs) if shard_de_docid(d, n_shards) == shard]
+
+    os.makedirs(directorio, exist_ok=True)
+    salida = ruta_shard(directorio, shard, n_shards)
+    print(f"🧩 Shard {shard + 1}/{n_shards}: {len(docids)} documentos")
+    evaluator.evaluate(docids=docids, verbose=False, resultados_path=salida, reanudar=reanudar)
+    return salida
+
+
+def _evaluar_shard(argumentos):
+    return evaluar_shard(*argumentos[:5], **argumentos[5])
+
+
+def fusionar_shards(rutas):
+    """
+    Junta los ficheros de resultados de los shards y calcula las métricas agregadas
+    con la misma función que una evaluación en un solo proceso.
+    """
+    filas = []
+    for ruta in rutas:
+        filas.extend(cargar_resultados(ruta)[0])
+    return calcular_metricas(filas)
+
+
+def evaluar_en_paralelo(directorio, mentions_path, docs_path, n_shards=4, procesos=None, **kwargs):
+    """
+    Evalúa los `n_shards` shards en un pool de procesos y fusiona los resultados.
+    Los kwargs se pasan a `evaluar_shard` (config_kwargs, corpus_path, solo_local, max_docs, reanudar).
+    """
+    procesos = procesos or n_shards
+    tareas = [(shard, n_shards, directorio, mentions_path, docs_path, kwargs) for shard in range(n_shards)]
+    with multiprocessing.get_context("spawn").Pool(procesos, maxtasksperchild=1) as pool:
+        rutas = pool.map(_evaluar_shard, tareas, chunksize=1)
+    return fusionar_shards(rutas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación repartida en shards por docid.")
+    sub = parser.add_subparsers(dest="accion", required=True)
+
+    def argumentos_evaluacion(p):
+        p.add_argument("directorio", help="Directorio de los ficheros de resultados por shard")
+        p.add_argument("--mentions", default="mentions.tsv", help="TSV de menciones gold")
+        p.add_argument("--docs", default="docs.tsv", help="TSV de documentos")
+        p.add_argument("--shards", type=int, required=True, help="Número total de shards")
+        p.add_argument("--config", default=None, help="Fichero JSON con parámetros de ConfigEL")
+        p.add_argument("--corpus", default=None, help="CorpusStore con los textos descargados")
+        p.add_argument("--solo-local", action="store_true", help="No descargar documentos")
+        p.add_argument("--max-docs", type=int, default=None, help="Evaluar solo los primeros documentos")
+        p.add_argument("--reanudar", action="store_true", help="Saltar los documentos ya terminados en los ficheros de resultados")
+
+    p_shard = sub.add_parser("shard", help="Evaluar un único shard (p. ej. uno por nodo)")
+    argumentos_evaluacion(p_shard)
+    p_shard.add_argument("--shard", type=int, required=True, help="Índice del shard (desde 0)")
+
+    p_todos = sub.add_parser("run", help="Evaluar todos los shards en procesos locales y fusionar")
+    argumentos_evaluacion(p_todos)
+    p_todos.add_argument("--procesos", type=int, default=None, help="Procesos simultáneos (por defecto, uno por shard)")
+
+    p_merge = sub.add_parser("merge", help="Fusionar los resultados de los shards")
+    p_merge.add_argument("directorio", help="Directorio con los ficheros shard-*.jsonl")
+    args = parser.parse_args()
+
+    if args.accion == "merge":
+        rutas = sorted(glob.glob(os.path.join(args.directorio, "shard-*.jsonl")))
+        totales = {int(os.path.basename(r).split("-")[3].split(".")[0]) for r in rutas}
+        if len(totales) > 1:
+            raise SystemExit(f"❌ Hay resultados de repartos distintos en {args.directorio}: {sorted(totales)} shards")
+        if totales and len(rutas) != next(iter(totales)):
+            print(f"⚠️ Solo hay {len(rutas)} de {next(iter(totales))} shards; las métricas son parciales")
+        print(f"🧩 Fusionando {len(rutas)} shards")
+        imprimir_metricas(fusionar_shards(rutas))
+        return
+
+    config_kwargs = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config_kwargs = json.load(f)
+    kwargs = dict(config_kwargs=config_kwargs, corpus_path=args.corpus, solo_local=args.solo_local,
+                  max_docs=args.max_docs, reanudar=args.reanudar)
+
+    if args.accion == "shard":
+        print(f"✅ Resultados en {evaluar_shard(args.shard, args.shards, args.directorio, args.mentions, args.docs, **kwargs)}")
+    else:
+        metricas = evaluar_en_paralelo(args.directorio, args.mentions, args.docs, n_shards=args.shards,
+                                       procesos=args.procesos, **kwargs)
+        imprimir_metricas(metricas)
+
+
+if __name__ == "__main__":
+    main()
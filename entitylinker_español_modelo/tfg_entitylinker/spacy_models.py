@@ -0,0 +1,36 @@
+import threading
+
+_modelos = {}
+_lock = threading.Lock()
+
+
+def obtener_modelo(model_name="es_core_news_lg", excluir=()):
+    """
+    Devuelve el pipeline de spaCy `model_name` sin los componentes de `excluir`,
+    cargándolo la primera vez que se pide.
+
+    Los modelos se guardan en un registro por proceso con clave
+    (nombre, componentes excluidos), así que NERDetector y las funciones de
+    contexto comparten una única instancia del mismo modelo.
+    `"blank:<idioma>"` devuelve un pipeline vacío (solo tokenizador).
+    """
+    clave = (model_name, tuple(sorted(excluir)))
+    nlp = _modelos.get(clave)
+    if nlp is None:
+        with _lock:
+            nlp = _modelos.get(clave)
+            if nlp is None:
+                import spacy
+                if model_name.startswith("blank:"):
+                    nlp = spacy.blank(model_name.split(":", 1)[1])
+                else:
+                    nlp = spacy.load(model_name, exclude=list(clave[1]))
+                _modelos[clave] = nlp
+    return nlp
+
+
+def modelos_cargados():
+    """
+    Claves (nombre, componentes excluidos) de los modelos ya cargados en este proceso.
+    """
+    return list(_modelos)
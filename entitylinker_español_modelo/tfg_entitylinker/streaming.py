@@ -0,0 +1,88 @@
+import json
+from itertools import islice
+
+
+def leer_jsonl(path):
+    """
+    Lee un fichero JSONL línea a línea (un documento por línea), sin cargarlo entero.
+    Las líneas vacías se ignoran.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if linea:
+                yield json.loads(linea)
+
+
+def _normalizar_documento(documento, indice, campo_id, campo_texto):
+    """
+    Devuelve (id, texto) de un documento dado como dict o como texto plano
+    (en ese caso el id es su posición en la entrada).
+    """
+    if isinstance(documento, str):
+        return indice, documento
+    texto = documento.get(campo_texto)
+    doc_id = documento.get(campo_id, indice)
+    if not isinstance(texto, str):
+        raise ValueError(f"El documento {doc_id} no tiene el campo de texto '{campo_texto}'")
+    return doc_id, texto
+
+
+def enlazar_stream(linker, documentos, ventana=32, campo_id="id", campo_texto="text"):
+    """
+    Enlaza un flujo de documentos y va devolviendo los resultados según terminan.
+
+    Como mucho hay `ventana` documentos en vuelo: se lee una ventana del iterador,
+    se enlaza con `linker.link_batch` (equivalente a `link` con `entidades_previas`
+    reiniciado en cada documento, como hace el Evaluator) y no se lee la siguiente
+    hasta que el consumidor ha recogido los resultados. La memoria no depende
+    del tamaño del corpus.
+
+    Args:
+        linker (EntityLinker): Linker ya construido.
+        documentos (iterable): Dicts con id y texto, o textos planos.
+        ventana (int): Documentos en vuelo como máximo.
+        campo_id (str): Campo con el identificador del documento.
+        campo_texto (str): Campo con el texto.
+
+    Yields:
+        dict: {campo_id: id, "entidades": [...]} con los offsets de carácter de cada mención.
+    """
+    documentos = iter(documentos)
+    indice = 0
+    while True:
+        bloque = list(islice(documentos, ventana))
+        if not bloque:
+            return
+        ids_textos = [_normalizar_documento(d, indice + i, campo_id, campo_texto) for i, d in enumerate(bloque)]
+        indice += len(bloque)
+
+        enlaces = linker.link_batch([texto for _, texto in ids_textos], batch_size=ventana)
+        for (doc_id, _), entidades in zip(ids_textos, enlaces):
+            yield {campo_id: doc_id, "entidades": [serializar_enlace(e) for e in entidades]}
+
+
+def serializar_enlace(enlace):
+    """
+    Enlace listo para JSON: los scores salen como escalares float32 de NumPy (ya redondeados a 3 decimales).
+    """
+    return {k: (round(float(v), 3) if k == "score" else v) for k, v in enlace.items()}
+
+
+def enlazar_jsonl(linker, entrada, salida, ventana=32, campo_id="id", campo_texto="text"):
+    """
+    Enlaza un fichero JSONL de documentos y escribe otro JSONL con un resultado por
+    documento, en el mismo orden. El fichero de salida se vuelca tras cada ventana.
+
+    Returns:
+        int: Número de documentos procesados.
+    """
+    total = 0
+    with open(salida, "w", encoding="utf-8") as out:
+        for resultado in enlazar_stream(linker, leer_jsonl(entrada), ventana=ventana,
+                                        campo_id=campo_id, campo_texto=campo_texto):
+            out.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            total += 1
+            if total % ventana == 0:
+                out.flush()
+    return total
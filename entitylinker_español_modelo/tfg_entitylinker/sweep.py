@@ -0,0 +1,193 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+
+from .cassette import PeticionNoGrabada
+from .config import ConfigEL
+from .evaluator import Evaluator, KS_RECALL
+
+# Objetivos de la frontera de Pareto: (métrica, True si más es mejor)
+OBJETIVOS = (
+    ("accuracy@1", True),
+    ("peticiones_http_por_mencion", False),
+    ("latencia_p95", False),
+)
+
+
+def expandir_grid(grid):
+    """
+    Producto cartesiano de un grid {parámetro: [valores]} en una lista de dicts,
+    en el orden de las claves del grid.
+    """
+    claves = list(grid)
+    for clave in claves:
+        if not hasattr(ConfigEL(), clave):
+            raise ValueError(f"Parámetro de ConfigEL desconocido en el grid: {clave}")
+    return [dict(zip(claves, valores)) for valores in itertools.product(*(grid[c] for c in claves))]
+
+
+def _domina(a, b, objetivos):
+    mejor_o_igual = all((a[m] >= b[m]) if mas else (a[m] <= b[m]) for m, mas in objetivos)
+    estrictamente = any((a[m] > b[m]) if mas else (a[m] < b[m]) for m, mas in objetivos)
+    return mejor_o_igual and estrictamente
+
+
+def frontera_pareto(resultados, objetivos=OBJETIVOS):
+    """
+    Marca cada resultado con `pareto` = True si ningún otro es igual o mejor en
+    todos los objetivos y estrictamente mejor en alguno.
+
+    Args:
+        resultados (list): Dicts con las métricas de `calcular_metricas`.
+        objetivos (tuple): (métrica, True si más es mejor).
+
+    Returns:
+        list: Los resultados de la frontera, en el orden recibido.
+    """
+    for r in resultados:
+        r["pareto"] = not any(_domina(otro, r, objetivos) for otro in resultados if otro is not r)
+    return [r for r in resultados if r["pareto"]]
+
+
+def barrer_configuraciones(grid, mentions_path, docs_path, corpus_path, base_config=None, max_docs=None,
+                           directorio=None, verbose=False):
+    """
+    Evalúa cada combinación del grid sobre el mismo corpus con un EntityLinker nuevo
+    (cachés en memoria vacías), de modo que las peticiones HTTP, las llamadas al
+    encoder y la latencia son comparables entre configuraciones.
+
+    Para que el barrido sea reproducible y sin red, los textos salen solo del
+    CorpusStore (`solo_local`) y las respuestas de Wikidata de una cassette
+    (`cassette_path` en `base_config`). La cassette se reproduce por petición
+    lógica, así que una sola grabación cubre todo el grid de `top_n_candidatos`
+    y `max_retries`. En reproducción estricta (por defecto) una petición no
+    grabada detiene el barrido con `PeticionNoGrabada`; con
+    `cassette_estricto=False`, las configuraciones con peticiones no grabadas
+    se evalúan sobre menos menciones y quedan fuera de la frontera de Pareto.
+    El modelo de Sentence-Transformers se carga una sola vez y se comparte
+    entre todas las configuraciones.
+
+    Args:
+        grid (dict): {parámetro de ConfigEL: [valores]}.
+        base_config (dict): Resto de parámetros de ConfigEL, comunes a todo el barrido.
+        directorio (str): Si se indica, las filas por mención de cada configuración
+            se guardan en `config-XXX.jsonl` dentro de él.
+
+    Returns:
+        list: Un dict por configuración con sus parámetros, sus métricas y `pareto`.
+    """
+    from .linker import EntityLinker
+
+    base_config = dict(base_config or {})
+    if base_config.get("cache_path"):
+        print("⚠️ Con cache_path las configuraciones comparten la caché persistente de Wikidata: "
+              "las peticiones HTTP de las primeras se ahorran en las siguientes")
+    if base_config.get("embedding_cache_dir"):
+        print("⚠️ Con embedding_cache_dir las llamadas al encoder de las primeras configuraciones "
+              "se ahorran en las siguientes")
+    if not base_config.get("cassette_path"):
+        print("⚠️ Sin cassette las peticiones van a Wikidata y el barrido no es reproducible")
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    combinaciones = expandir_grid(grid)
+    resultados = []
+    encoder = None
+    for i, parametros in enumerate(combinaciones):
+        print(f"\n🔧 Configuración {i + 1}/{len(combinaciones)}: {parametros}")
+        linker = EntityLinker(ConfigEL(**{**base_config, **parametros}), encoder=encoder)
+        encoder = linker.encoder
+        evaluator = Evaluator(linker, mentions_path, docs_path, corpus_path=corpus_path, solo_local=True)
+        resultados_path = os.path.join(directorio, f"config-{i:03d}.jsonl") if directorio else None
+        metricas = evaluator.evaluate(max_docs=max_docs, verbose=verbose, resultados_path=resultados_path)
+
+        # Cierra el pool de hilos y la cassette (lo grabado queda en disco para la siguiente configuración)
+        linker.close()
+        no_grabadas = getattr(linker.retriever.transport, "no_grabadas", 0)
+        if no_grabadas:
+            print(f"⚠️ {no_grabadas} peticiones no estaban en la cassette (se respondieron con 404): "
+                  f"esta configuración queda fuera de la frontera de Pareto; grábalas con --grabar")
+        resultados.append({**parametros, **metricas, "no_grabadas": no_grabadas})
+
+    # Solo se comparan configuraciones evaluadas sobre las mismas menciones
+    frontera_pareto([r for r in resultados if not r["no_grabadas"]])
+    for r in resultados:
+        r.setdefault("pareto", False)
+    return resultados
+
+
+def guardar_resultados(resultados, path):
+    """
+    Guarda el barrido como CSV (extensión .csv) o JSONL (cualquier otra).
+    """
+    if path.lower().endswith(".csv"):
+        columnas = list(dict.fromkeys(k for r in resultados for k in r))
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            escritor = csv.DictWriter(f, fieldnames=columnas)
+            escritor.writeheader()
+            escritor.writerows(resultados)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resultados))
+
+
+def imprimir_barrido(resultados, parametros):
+    """
+    Tabla del barrido ordenada por accuracy@1; las configuraciones de la frontera de Pareto van marcadas con ⭐.
+    """
+    metricas = ["accuracy@1", "MRR"] + [f"recall@{k}" for k in KS_RECALL] + [
+        "peticiones_http_por_mencion", "llamadas_encoder", "latencia_p50", "latencia_p95"]
+    cabecera = ["", *parametros, *metricas]
+    filas = [
+        ["⭐" if r["pareto"] else "", *(str(r[p]) for p in parametros), *(f"{r[m]:g}" for m in metricas)]
+        for r in sorted(resultados, key=lambda r: -r["accuracy@1"])
+    ]
+    anchos = [max(len(str(c)) for c in columna) for columna in zip(cabecera, *filas)]
+    print("\n==== BARRIDO DE CONFIGURACIONES ====")
+    for fila in [cabecera, *filas]:
+        print("  ".join(str(c).ljust(a) for c, a in zip(fila, anchos)))
+    print(f"⭐ Frontera de Pareto: máxima accuracy@1 con mínimas peticiones HTTP por mención y latencia p95 "
+          f"({sum(r['pareto'] for r in resultados)} de {len(resultados)} configuraciones)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Barrido de parámetros de ConfigEL: precisión frente a coste sobre un corpus reproducible."
+    )
+    parser.add_argument("grid", help="JSON {parámetro: [valores]}, p. ej. {\"top_n_candidatos\": [5, 10, 20]}")
+    parser.add_argument("--mentions", default="mentions.tsv", help="TSV de menciones gold")
+    parser.add_argument("--docs", default="docs.tsv", help="TSV de documentos")
+    parser.add_argument("--corpus", required=True, help="CorpusStore con los textos (ver corpus_store)")
+    parser.add_argument("--cassette", default=None, help="Cassette con las respuestas de Wikidata")
+    parser.add_argument("--grabar", action="store_true", help="Grabar en la cassette las peticiones que falten")
+    parser.add_argument("--config", default=None, help="Fichero JSON con el resto de parámetros de ConfigEL")
+    parser.add_argument("--max-docs", type=int, default=None, help="Evaluar solo los primeros documentos")
+    parser.add_argument("--directorio", default=None, help="Guardar las filas por mención de cada configuración")
+    parser.add_argument("--salida", default=None, help="Resumen del barrido (.csv o .jsonl)")
+    args = parser.parse_args()
+
+    with open(args.grid, encoding="utf-8") as f:
+        grid = json.load(f)
+    base_config = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            base_config = json.load(f)
+    if args.cassette:
+        base_config["cassette_path"] = args.cassette
+        base_config["cassette_modo"] = "record" if args.grabar else "replay"
+
+    try:
+        resultados = barrer_configuraciones(grid, args.mentions, args.docs, args.corpus, base_config=base_config,
+                                            max_docs=args.max_docs, directorio=args.directorio)
+    except PeticionNoGrabada as e:
+        raise SystemExit(f"❌ {e}. Vuelve a lanzar el barrido con --grabar para completar la cassette")
+    imprimir_barrido(resultados, list(grid))
+    if args.salida:
+        guardar_resultados(resultados, args.salida)
+        print(f"✅ Barrido guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
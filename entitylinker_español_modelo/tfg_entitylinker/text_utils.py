@@ -1,3 +1,6 @@
+import re
+import unicodedata
+
 
 def build_entity_text(label, matched_alias, description):
     '''
@@ -22,3 +25,19 @@ def build_entity_text(label, matched_alias, description):
     if description:
         partes.append(description.strip())
     return ". ".join(partes)
+
+
+def normalizar_mencion(texto):
+    '''
+    Normaliza una mención para usarla como clave de caché:
+    minúsculas, sin tildes ni diacríticos y con los espacios colapsados.
+
+    Args:
+        texto (str): Mención original.
+
+    Returns:
+        str: Mención normalizada.
+    '''
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    sin_tildes = "".join(ch for ch in descompuesto if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", sin_tildes).strip()
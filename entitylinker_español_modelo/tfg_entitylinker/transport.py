@@ -0,0 +1,41 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import __version__
+
+USER_AGENT_POR_DEFECTO = (
+    f"tfg_entitylinker/{__version__} "
+    "(https://github.com/gplsi/tools-entity-linking) python-requests/" + requests.__version__
+)
+
+
+class HTTPTransport:
+    """
+    Transporte HTTP con pool de conexiones keep-alive para hablar con la API de Wikidata.
+
+    - Reutiliza las conexiones TCP/TLS entre peticiones mediante una `requests.Session`.
+    - Negocia compresión gzip y envía un User-Agent propio por instancia
+      (la política de Wikimedia exige un User-Agent identificable).
+    - Se puede sustituir por cualquier objeto con el mismo método `get`
+      (p. ej. un servidor local de pruebas o de benchmarks).
+    """
+    def __init__(self, pool_size=10, connect_timeout=5, read_timeout=10, user_agent=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.peticiones = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": user_agent or USER_AGENT_POR_DEFECTO,
+            "Accept-Encoding": "gzip, deflate",
+        })
+        # Los reintentos los gestiona safe_get, el adaptador solo mantiene el pool
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None):
+        self.peticiones += 1
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()